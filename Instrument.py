@@ -1,88 +1,232 @@
 import os
+import io
+import json
+import shutil
+import struct
+import bisect
+import hashlib
+import numpy as np
 import regex as re
+from concurrent.futures import ProcessPoolExecutor
 
-print_counter = 1
+# Stands in for the site ID while a file is instrumented; sites are numbered
+# afterwards in traversal order by number_sites(), so serial and parallel
+# runs write the same IDs.
+SITE_PLACEHOLDER = '\0PILLM_SITE\0'
+
+# Re-runs and --revert work from a manifest in the source root that records,
+# per file, the pristine and instrumented hashes and the site-ID range, and
+# from a copy of every pristine file kept next to it.
+MANIFEST_FILENAME = '.pillm_manifest.json'
+PRISTINE_DIRNAME = '.pillm_pristine'
+
+# Fixed-size records (start line, end line, file name, function name) indexed
+# by site ID; must match extract_functions.SITE_DTYPE.
+SITES_FILENAME = 'PILLMSites.tbl'
+SITE_RECORD = struct.Struct('<ii124s124s')
 
 def create_instrumentation_header(root_dir):
 
     instrumentation_header_path = os.path.join(root_dir, "PILLMInstrumentation.h")
 
+    sites_path = os.path.abspath(os.path.join(root_dir, SITES_FILENAME))
+
     header_content = r'''#ifndef PILLM_INSTRUMENTATION_H
 #define PILLM_INSTRUMENTATION_H
 
 #include <atomic>
-#include <fstream>
-#include <mutex>
-#include <algorithm> // for std::max
-#include <cstring>   // for strncpy
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
 
 #ifdef __cplusplus
 extern "C" {
 #endif
 
-// We store integer markers here, if desired.
-inline std::atomic<int> g_pillm_map[100000] = {};
+// Site table written by Instrument.py: one fixed-size record per site ID
+// (start line, end line, file name, function name).
+#define PILLM_SITES_PATH @SITES_PATH@
+#define PILLM_SITE_RECORD_SIZE 256
+#define PILLM_DEFAULT_SITES 100000
+#define PILLM_RING_SIZE 100
+
+// Per-site hit counters and the ring of the last calls live in one region:
+// a PillmRegionHeader, ringSize u64 ring slots, then siteCount u32 counters.
+// With PILLM_SHM_ID set, the region is the POSIX shared memory object of that
+// name, created and sized by the fuzzer (site_counters.py), so it can be read
+// while JSC runs and after it crashed or timed out. Otherwise it is a private
+// allocation sized by the site table.
+struct PillmRegionHeader {
+    char magic[8];
+    uint32_t version;
+    uint32_t siteCount;
+    uint32_t ringSize;
+    uint32_t reserved;
+    std::atomic<uint64_t> index;
+};
 
-// We'll track the last 100 function calls.
-struct FunctionRecord {
-    int startLine;
-    int endLine;
-    int executionIndex; // increments each time a function is recorded
-    char fileName[128];
-    char functionName[128];
+struct PillmState {
+    std::atomic<uint64_t>* index;
+    std::atomic<uint64_t>* ring;
+    std::atomic<uint32_t>* hits;
+    uint32_t ringSize;
+    uint32_t siteCount;
 };
 
-inline FunctionRecord s_functionRecords[100] = {};
-inline std::atomic<int> s_functionIndex(0);
-inline std::mutex s_dumpMutex;
+inline size_t pillm_region_size(uint32_t siteCount, uint32_t ringSize)
+{
+    return sizeof(PillmRegionHeader) + ringSize * sizeof(uint64_t) + siteCount * sizeof(uint32_t);
+}
+
+inline bool pillm_attach(PillmState* state, void* memory)
+{
+    PillmRegionHeader* header = static_cast<PillmRegionHeader*>(memory);
+    if (std::memcmp(header->magic, "PILLMSHM", sizeof(header->magic)) || !header->ringSize)
+        return false;
+    state->index = &header->index;
+    state->ring = reinterpret_cast<std::atomic<uint64_t>*>(header + 1);
+    state->hits = reinterpret_cast<std::atomic<uint32_t>*>(state->ring + header->ringSize);
+    state->ringSize = header->ringSize;
+    state->siteCount = header->siteCount;
+    return true;
+}
+
+inline bool pillm_map_shared_region(PillmState* state, const char* name)
+{
+    int fd = shm_open(name, O_RDWR, 0);
+    if (fd < 0)
+        return false;
+    struct stat info;
+    void* memory = MAP_FAILED;
+    if (!fstat(fd, &info) && static_cast<size_t>(info.st_size) >= sizeof(PillmRegionHeader))
+        memory = mmap(nullptr, info.st_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (memory == MAP_FAILED)
+        return false;
+    PillmRegionHeader* header = static_cast<PillmRegionHeader*>(memory);
+    if (pillm_region_size(header->siteCount, header->ringSize) > static_cast<size_t>(info.st_size)
+        || !pillm_attach(state, memory)) {
+        munmap(memory, info.st_size);
+        return false;
+    }
+    return true;
+}
 
-// Store the function start/end lines, plus file and function names.
-inline void pillm_store_function(int startLine, int endLine,
-                                 const char* fileName, const char* functionName)
+inline PillmState pillm_init()
 {
-    // Atomically increment the function index, then store into ring buffer
-    int index = s_functionIndex.fetch_add(1, std::memory_order_relaxed);
-    int slot = index % 100;
-
-    {
-        std::lock_guard<std::mutex> lock(s_dumpMutex);
-        s_functionRecords[slot].startLine = startLine;
-        s_functionRecords[slot].endLine   = endLine;
-        s_functionRecords[slot].executionIndex = index + 1;
-
-        // Copy fileName and functionName into the ring buffer record
-        std::strncpy(s_functionRecords[slot].fileName, fileName, 127);
-        s_functionRecords[slot].fileName[127] = '\0';
-
-        std::strncpy(s_functionRecords[slot].functionName, functionName, 127);
-        s_functionRecords[slot].functionName[127] = '\0';
+    PillmState state = {};
+    const char* shmId = std::getenv("PILLM_SHM_ID");
+    if (shmId && pillm_map_shared_region(&state, shmId))
+        return state;
+
+    const char* sitesPath = std::getenv("PILLM_SITES");
+    struct stat info;
+    uint32_t siteCount = PILLM_DEFAULT_SITES;
+    if (!stat(sitesPath ? sitesPath : PILLM_SITES_PATH, &info) && info.st_size)
+        siteCount = static_cast<uint32_t>(info.st_size / PILLM_SITE_RECORD_SIZE);
+
+    void* memory = std::calloc(1, pillm_region_size(siteCount, PILLM_RING_SIZE));
+    if (!memory) {
+        // No counters and no ring: recording and the dump become no-ops.
+        static std::atomic<uint64_t> unusedIndex;
+        state.index = &unusedIndex;
+        return state;
     }
+    PillmRegionHeader* header = static_cast<PillmRegionHeader*>(memory);
+    std::memcpy(header->magic, "PILLMSHM", sizeof(header->magic));
+    header->version = 1;
+    header->siteCount = siteCount;
+    header->ringSize = PILLM_RING_SIZE;
+    pillm_attach(&state, memory);
+    return state;
 }
 
-// Dump the last 100 function records to pillm_dump.txt
+inline PillmState& pillm_state()
+{
+    static PillmState state = pillm_init();
+    return state;
+}
+
+// Each ring slot holds (executionIndex << 24) | siteId, so recording is a
+// few relaxed atomics with no lock and no string copies; names are looked
+// up in the site table when the trace is read. The line argument is no
+// longer stored; it stays so that trees instrumented with it still build.
+inline void pillm_store_function(uint32_t siteId, int line)
+{
+    (void)line;
+    PillmState& state = pillm_state();
+    // A plain load and store: concurrent threads may lose an increment, but
+    // hot sites avoid a locked read-modify-write.
+    if (siteId < state.siteCount)
+        state.hits[siteId].store(state.hits[siteId].load(std::memory_order_relaxed) + 1, std::memory_order_relaxed);
+    if (!state.ringSize)
+        return;
+
+    uint64_t index = state.index->fetch_add(1, std::memory_order_relaxed);
+    state.ring[index % state.ringSize].store(((index + 1) << 24) | siteId, std::memory_order_relaxed);
+}
+
+// Header of pillm_trace.bin; the site table path follows it and the records
+// start at recordsOffset. Read by extract_functions.read_pillm_trace().
+struct PillmTraceHeader {
+    char magic[8];
+    uint32_t version;
+    uint32_t recordsOffset;
+    uint64_t total;
+    uint32_t count;
+    uint32_t sitesPathLength;
+};
+
+// Dump the last 100 function records to pillm_trace.bin
 inline void pillm_dump_last_100()
 {
-    std::lock_guard<std::mutex> lock(s_dumpMutex);
+    PillmState& state = pillm_state();
+    if (!state.ringSize)
+        return;
 
-    std::ofstream outFile("pillm_dump.txt", std::ios::out | std::ios::trunc);
+    FILE* outFile = std::fopen("pillm_trace.bin", "wb");
     if (!outFile)
         return;
 
-    int total = s_functionIndex.load(std::memory_order_relaxed);
-    // Only print the last 100
-    int start = std::max(0, total - 100);
-    for (int i = start; i < total; i++) {
-        int slot = i % 100;
-        const auto& record = s_functionRecords[slot];
-        outFile << "[Execution #" << record.executionIndex << "] "
-                << record.fileName << "::" << record.functionName
-                << " (start line: " << record.startLine
-                << ", end line: " << record.endLine
-                << ")" << std::endl;
+    const char* sitesPath = std::getenv("PILLM_SITES");
+    if (!sitesPath)
+        sitesPath = PILLM_SITES_PATH;
+
+    uint64_t total = state.index->load(std::memory_order_relaxed);
+    // Only keep the last ringSize (100) records
+    uint64_t start = total > state.ringSize ? total - state.ringSize : 0;
+    uint32_t count = 0;
+    uint64_t* records = static_cast<uint64_t*>(std::malloc(state.ringSize * sizeof(uint64_t)));
+    if (!records) {
+        std::fclose(outFile);
+        return;
     }
+    for (uint64_t i = start; i < total; i++)
+        records[count++] = state.ring[i % state.ringSize].load(std::memory_order_relaxed);
+
+    PillmTraceHeader header = {};
+    std::memcpy(header.magic, "PILLMTRC", sizeof(header.magic));
+    header.version = 1;
+    header.sitesPathLength = static_cast<uint32_t>(std::strlen(sitesPath));
+    header.recordsOffset = (sizeof(header) + header.sitesPathLength + 7) & ~7u;
+    header.total = total;
+    header.count = count;
+
+    static const char padding[8] = {};
+    std::fwrite(&header, sizeof(header), 1, outFile);
+    std::fwrite(sitesPath, 1, header.sitesPathLength, outFile);
+    std::fwrite(padding, 1, header.recordsOffset - sizeof(header) - header.sitesPathLength, outFile);
+    std::fwrite(records, sizeof(uint64_t), count, outFile);
+    std::free(records);
+    std::fclose(outFile);
 }
 
-// A static destructor that flushes the ring buffer to pillm_dump.txt at shutdown.
+// A static destructor that flushes the ring buffer to pillm_trace.bin at shutdown.
 struct PillmDumper {
     ~PillmDumper() {
         pillm_dump_last_100();
@@ -97,21 +241,23 @@ inline PillmDumper s_dumper;
 #endif
 
 #endif // PILLM_INSTRUMENTATION_H
-'''
+'''.replace('@SITES_PATH@', json.dumps(sites_path))
+
+    # Rewriting an unchanged header would rebuild every file that includes it.
+    if os.path.exists(instrumentation_header_path):
+        with open(instrumentation_header_path, 'r') as f:
+            if f.read() == header_content:
+                return
 
     with open(instrumentation_header_path, 'w') as f:
         f.write(header_content)
 
-def add_instrumentation_include(filepath):
-
-    with open(filepath, 'r') as file:
-        content = file.read()
+def add_instrumentation_include(content):
 
     if '#include "PILLMInstrumentation.h"' not in content:
         content = '#include "PILLMInstrumentation.h"\n' + content
 
-    with open(filepath, 'w') as file:
-        file.write(content)
+    return content
 
 def check_define_pattern(content, start_brace_index):
 
@@ -136,14 +282,29 @@ def get_function_name(content, start_brace_index):
             return match.group(1)
     return "UnknownFunction"
 
-def modify_functions(filepath):
+def instrument_file(filepath):
     with open(filepath, 'r') as file:
-        lines = file.readlines()
+        content = file.read()
 
-    lines = [
-        re.sub(r'\s*(?!//")(?!//.+\\n")//(?! anonymous namespace)(?! namespace\b).*', '', line)
-        for line in lines
-    ]
+    content = add_instrumentation_include(content)
+    return modify_functions(io.StringIO(content).readlines(), os.path.basename(filepath))
+
+def write_sites(root_dir, first_site, sites, truncate=False):
+    sites_path = os.path.join(root_dir, SITES_FILENAME)
+    with open(sites_path, 'wb' if truncate or not os.path.exists(sites_path) else 'r+b') as f:
+        if not sites:
+            return
+        f.seek(first_site * SITE_RECORD.size)
+        f.write(b''.join(
+            SITE_RECORD.pack(start_line, end_line, filename.encode()[:123], func_name.encode()[:123])
+            for start_line, end_line, filename, func_name in sites
+        ))
+
+LINE_COMMENT_PATTERN = re.compile(r'\s*(?!//")(?!//.+\\n")//(?! anonymous namespace)(?! namespace\b).*')
+BRACE_PATTERN = re.compile(r'[{}]')
+
+def modify_functions(lines, filename, analyzer=None):
+    lines = [LINE_COMMENT_PATTERN.sub('', line) for line in lines]
     content_string = ''.join(lines)
 
     block_comment_pattern = re.compile(
@@ -158,21 +319,23 @@ def modify_functions(filepath):
     return_code_pattern = re.compile(r'^(\s*)return(?:\s+|;)(.*?)(;?)(\s*)$', re.MULTILINE)
     return_pattern = re.compile(r'\breturn\b(?:\s*;|\s)')
 
-    modified_content = ''
-    filter_pattern = False
+    ranges = (analyzer or FunctionRanges)(content)
 
-    filename = os.path.basename(filepath)
+    modified_content = []
+    sites = []
+    filter_pattern = False
 
     for index, line in enumerate(content):
         if '#define ' in line and ' return' in line:
             filter_pattern = True
 
         if return_code_pattern.match(line) and not filter_pattern and not line.strip().endswith('\\'):
-            instrumentation_code, _ = insert_memory_statement(
-                index, line, content, filename
+            instrumentation_code, site = insert_memory_statement(
+                index, line, content, filename, ranges
             )
             if instrumentation_code:
-                modified_content += instrumentation_code
+                modified_content.append(instrumentation_code)
+                sites.append(site)
 
         if (
             index > 0
@@ -224,26 +387,23 @@ def modify_functions(filepath):
             if content[index + 1].strip().endswith(';'):
                 line = line.rstrip() + ' {\n'
 
-        modified_content += line
+        modified_content.append(line)
 
-    with open(filepath, 'w') as f:
-        f.write(modified_content)
+    return ''.join(modified_content), sites
 
-def insert_memory_statement(return_index, return_line, content, filename):
-    global print_counter
+def insert_memory_statement(return_index, return_line, content, filename, ranges):
 
-    start_brace_index, end_brace_index = find_function_braces(return_index, content)
+    start_brace_index, end_brace_index = ranges.function_braces(return_index)
 
     if check_define_pattern(content, start_brace_index):
-        return "", print_counter
+        return "", None
 
-    function_code = extract_function_code(content, start_brace_index, end_brace_index)
-
-    if ("static_assert" in function_code
-            or "constexpr" in function_code
-            or "#define" in function_code
-            or ("@begin" in function_code and "@end" in function_code)):
-        return "", print_counter
+    if (ranges.contains(start_brace_index, end_brace_index, "static_assert")
+            or ranges.contains(start_brace_index, end_brace_index, "constexpr")
+            or ranges.contains(start_brace_index, end_brace_index, "#define")
+            or (ranges.contains(start_brace_index, end_brace_index, "@begin")
+                and ranges.contains(start_brace_index, end_brace_index, "@end"))):
+        return "", None
 
     func_name = get_function_name(content, start_brace_index)
 
@@ -252,16 +412,10 @@ def insert_memory_statement(return_index, return_line, content, filename):
 
     indentation = re.match(r'\s*', return_line).group(0)
 
-    safe_func_name = func_name.replace('\\', '\\\\').replace('"', '\\"')
-    safe_file_name = filename.replace('\\', '\\\\').replace('"', '\\"')
-
-    instrumentation_code = (
-        f'{indentation}g_pillm_map[{print_counter}].store(__LINE__, std::memory_order_relaxed);\n'
-        f'{indentation}pillm_store_function({start_line_number}, {end_line_number}, "{safe_file_name}", "{safe_func_name}");\n'
-    )
-    print_counter += 1
+    # Names go to the site table; the probe itself only carries the site ID.
+    instrumentation_code = f'{indentation}pillm_store_function({SITE_PLACEHOLDER}, __LINE__);\n'
 
-    return instrumentation_code, print_counter
+    return instrumentation_code, (start_line_number, end_line_number, filename, func_name)
 
 def find_function_braces(return_index, content):
 
@@ -308,33 +462,285 @@ def extract_function_code(content, start_brace_index, end_brace_index):
     snippet = content[start_brace_index:end_brace_index+1]
     return ''.join(snippet)
 
-def process_cpp_files(root_dir):
-
-    global print_counter
-    create_instrumentation_header(root_dir)
-
+# Reference implementation: rescans the file around every return.
+class ScanRanges:
+
+    def __init__(self, content):
+        self.content = content
+
+    def function_braces(self, return_index):
+        return find_function_braces(return_index, self.content)
+
+    def contains(self, start_brace_index, end_brace_index, token):
+        return token in extract_function_code(self.content, start_brace_index, end_brace_index)
+
+FILTER_TOKENS = ("static_assert", "constexpr", "#define", "@begin", "@end")
+NO_HIT = -(1 << 40)
+
+# Gives the same answers as ScanRanges from tables built in one pass over the
+# file, so large files no longer cost O(returns * lines).
+#
+# Forward, find_function_braces stops at the first line where the '}' seen
+# since the return outnumber the '{' on the return line: a bisect on prefix
+# sums of '}'. The '}' left over seed the backward scan, in which each line
+# maps the stack size s to max(s + d, z) (d = '}' minus '{', z = the result
+# for s = 0) and the scan stops after the first line that leaves it empty.
+# Those maps compose, so doubling tables over spans of 2^k lines (net change,
+# result from 0, largest input that empties the stack somewhere in the span)
+# find the stopping line in O(log n).
+class FunctionRanges:
+
+    def __init__(self, content):
+        self.content = content
+        n = len(content)
+
+        closes = [0]
+        d = np.zeros(n, dtype=np.int64)
+        z = np.zeros(n, dtype=np.int64)
+        for i, line in enumerate(content):
+            stack = 0
+            opens = 0
+            close_count = 0
+            for ch in BRACE_PATTERN.findall(line):
+                if ch == '}':
+                    stack += 1
+                    close_count += 1
+                else:
+                    opens += 1
+                    if stack:
+                        stack -= 1
+            closes.append(closes[-1] + close_count)
+            d[i] = close_count - opens
+            z[i] = stack
+        self.closes = closes
+
+        # Level k, index p: lines p, p-1, ..., p-2^k+1 in scan order.
+        h = np.where(z == 0, -d, NO_HIT)
+        self.levels = [(d, z, h)]
+        span = 1
+        while span * 2 <= n:
+            d_a, z_a, h_a = self.levels[-1]
+            a = slice(span * 2 - 1, n)
+            b = slice(span - 1, n - span)
+            level_d = np.zeros(n, dtype=np.int64)
+            level_z = np.zeros(n, dtype=np.int64)
+            level_h = np.full(n, NO_HIT, dtype=np.int64)
+            level_d[a] = d_a[a] + d_a[b]
+            level_z[a] = np.maximum(z_a[a] + d_a[b], z_a[b])
+            level_h[a] = np.maximum(h_a[a], np.where(z_a[a] <= h_a[b], h_a[b] - d_a[a], NO_HIT))
+            self.levels.append((level_d, level_z, level_h))
+            span *= 2
+
+        self.token_counts = {}
+        for token in FILTER_TOKENS:
+            counts = [0]
+            for line in content:
+                counts.append(counts[-1] + (token in line))
+            self.token_counts[token] = counts
+
+    def function_braces(self, return_index):
+        n = len(self.content)
+        open_brace_count = self.content[return_index].count('{')
+
+        limit = self.closes[return_index] + open_brace_count
+        end = bisect.bisect_right(self.closes, limit, return_index + 1) - 1
+        if end < n:
+            stack = self.closes[end + 1] - limit
+        else:
+            stack = 0
+
+        i = return_index - 1
+        for k in range(len(self.levels) - 1, -1, -1):
+            span = 1 << k
+            level_d, level_z, level_h = self.levels[k]
+            if i - span + 1 >= 0 and stack > level_h[i]:
+                stack = max(stack + int(level_d[i]), int(level_z[i]))
+                i -= span
+
+        start_brace_index = max(i - 1, 0)
+        end_brace_index = min(end, n - 1)
+        return start_brace_index, end_brace_index
+
+    def contains(self, start_brace_index, end_brace_index, token):
+        counts = self.token_counts[token]
+        return counts[end_brace_index + 1] - counts[start_brace_index] > 0
+
+def number_sites(modified_content, first_site):
+    parts = modified_content.split(SITE_PLACEHOLDER)
+    numbered = [parts[0]]
+    for site, part in enumerate(parts[1:], first_site):
+        numbered.append(str(site))
+        numbered.append(part)
+    return ''.join(numbered), first_site + len(parts) - 1
+
+def get_cpp_files(root_dir):
+    cpp_files = []
     for root, dirs, files in os.walk(root_dir):
+        dirs[:] = [d for d in dirs if d != PRISTINE_DIRNAME]
         if 'jit' in root.split(os.path.sep):
             continue
 
         for file in files:
             if file.endswith('.cpp'):
-                filepath = os.path.join(root, file)
-                add_instrumentation_include(filepath)
-                modify_functions(filepath)
+                cpp_files.append(os.path.join(root, file))
+    return cpp_files
+
+def file_hash(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_manifest(root_dir):
+    manifest_path = os.path.join(root_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {'next_site': 1, 'files': {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(root_dir, manifest):
+    manifest_path = os.path.join(root_dir, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def allocate_sites(manifest, entry, site_count):
+    # A file keeps its range while its sites fit, so that a change upstream
+    # does not renumber (and force a rebuild of) every file after it.
+    if entry is not None and site_count <= entry['capacity']:
+        return entry['first_site'], entry['capacity']
+    first_site = manifest['next_site']
+    manifest['next_site'] += site_count
+    return first_site, site_count
+
+def plan_files(root_dir, manifest):
+    # Returns the files to (re-)instrument, and the number left untouched.
+    pending = []
+    unchanged = 0
+    for filepath in get_cpp_files(root_dir):
+        relative_path = os.path.relpath(filepath, root_dir)
+        pristine_path = os.path.join(root_dir, PRISTINE_DIRNAME, relative_path)
+        entry = manifest['files'].get(relative_path)
+        current_hash = file_hash(filepath)
+
+        if entry is not None and current_hash == entry['instrumented']:
+            unchanged += 1
+            continue
+
+        with open(filepath, 'r') as f:
+            has_probes = 'pillm_store_function(' in f.read()
+        if has_probes and entry is None:
+            print(f"[PILLM] Skipping {relative_path}: already instrumented but not in the manifest. "
+                  f"Restore it from version control first.")
+            continue
+        if has_probes:
+            # Edited locally after instrumentation: the pristine copy and the
+            # manifest entry stay as they are.
+            print(f"[PILLM] Skipping {relative_path}: it changed since it was instrumented but still has probes. "
+                  f"Apply the edit to {os.path.relpath(pristine_path, root_dir)} and copy that over it.")
+            continue
+
+        # New file, or changed upstream since it was instrumented.
+        os.makedirs(os.path.dirname(pristine_path), exist_ok=True)
+        shutil.copyfile(filepath, pristine_path)
+        pending.append((filepath, relative_path, pristine_path, current_hash))
+
+    for relative_path in list(manifest['files']):
+        if not os.path.exists(os.path.join(root_dir, relative_path)):
+            del manifest['files'][relative_path]
+            pristine_path = os.path.join(root_dir, PRISTINE_DIRNAME, relative_path)
+            if os.path.exists(pristine_path):
+                os.remove(pristine_path)
+    return pending, unchanged
 
-    return print_counter
+def process_cpp_files(root_dir, jobs=1):
+
+    create_instrumentation_header(root_dir)
+
+    manifest = load_manifest(root_dir)
+    pending, unchanged = plan_files(root_dir, manifest)
+    pristine_paths = [pristine_path for _, _, pristine_path, _ in pending]
+
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and len(pending) > 1 else None
+    try:
+        if pool is not None:
+            results = pool.map(instrument_file, pristine_paths, chunksize=4)
+        else:
+            results = map(instrument_file, pristine_paths)
+
+        # Results come back in traversal order, whichever worker finished first.
+        write_sites(root_dir, 0, [], truncate=not manifest['files'])
+        for (filepath, relative_path, _, pristine_hash), (modified_content, sites) in zip(pending, results):
+            site_count = len(sites)
+            first_site, capacity = allocate_sites(manifest, manifest['files'].get(relative_path), site_count)
+            modified_content, _ = number_sites(modified_content, first_site)
+            with open(filepath, 'w') as f:
+                f.write(modified_content)
+            write_sites(root_dir, first_site, sites)
+            manifest['files'][relative_path] = {
+                'pristine': pristine_hash,
+                'instrumented': file_hash(filepath),
+                'first_site': first_site,
+                'sites': site_count,
+                'capacity': capacity,
+            }
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        save_manifest(root_dir, manifest)
+
+    print(f"[PILLM] Instrumented {len(pending)} files, {unchanged} unchanged since the last run.")
+    return sum(entry['sites'] for entry in manifest['files'].values())
+
+def revert_cpp_files(root_dir):
+    manifest = load_manifest(root_dir)
+    pristine_dir = os.path.join(root_dir, PRISTINE_DIRNAME)
+    restored = 0
+    kept = {}
+    for relative_path, entry in manifest['files'].items():
+        filepath = os.path.join(root_dir, relative_path)
+        if not os.path.exists(filepath):
+            # Deleted from the tree since; there is nothing to restore.
+            print(f"[PILLM] Warning: {relative_path} no longer exists. Dropping it from the manifest.")
+            pristine_path = os.path.join(pristine_dir, relative_path)
+            if os.path.exists(pristine_path):
+                os.remove(pristine_path)
+            continue
+        if file_hash(filepath) != entry['instrumented']:
+            # Edited after instrumentation; leave both copies for a manual look.
+            print(f"[PILLM] Not reverting {relative_path}: it changed since it was instrumented.")
+            kept[relative_path] = entry
+            continue
+        # copyfile, not copy2: the restored file must look newer than the
+        # object built from the instrumented one.
+        shutil.copyfile(os.path.join(pristine_dir, relative_path), filepath)
+        restored += 1
+
+    if kept:
+        manifest['files'] = kept
+        save_manifest(root_dir, manifest)
+    else:
+        shutil.rmtree(pristine_dir, ignore_errors=True)
+        for name in (MANIFEST_FILENAME, SITES_FILENAME, "PILLMInstrumentation.h"):
+            if os.path.exists(os.path.join(root_dir, name)):
+                os.remove(os.path.join(root_dir, name))
+    print(f"[PILLM] Restored {restored} files from pristine copies.")
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Instrument JSC with PILLM instrumentation.')
     parser.add_argument('--source', type=str, required=True,
                         help='Path to the JavaScriptCore (or WebKit) source code directory.')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='Number of processes instrumenting files concurrently (default: all CPUs)')
+    parser.add_argument('--revert', action='store_true',
+                        help='Restore the files recorded in the manifest to their pristine contents')
     args = parser.parse_args()
 
-    global print_counter
-    final_count = process_cpp_files(args.source)
-    print(f"[PILLM] Total instrumentation sites inserted: {final_count - 1}")
+    if args.revert:
+        revert_cpp_files(args.source)
+        return
+
+    total_sites = process_cpp_files(args.source, args.jobs)
+    print(f"[PILLM] Total instrumentation sites inserted: {total_sites}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+import os
+import io
+import time
+import argparse
+import Instrument
+
+# Times modify_functions on the largest .cpp files of a source tree with the
+# rescanning reference (ScanRanges) and the one-pass analyzer (FunctionRanges),
+# and checks that both produce the same instrumented text.
+
+def synthetic_source(functions, cases):
+    # Long functions with many returns, the shape of Interpreter.cpp and
+    # CodeBlock.cpp that made the rescanning quadratic.
+    parts = ['#include "config.h"\n', 'namespace JSC {\n']
+    for i in range(functions):
+        parts.append(f'JSValue Handler{i}::run(CallFrame* callFrame, int op)\n{{\n')
+        parts.append('    switch (op) {\n')
+        for case in range(cases):
+            parts.append(f'    case {case}:\n')
+            parts.append(f'        if (callFrame->argumentCount() > {case})\n')
+            parts.append(f'            return jsNumber({case});\n')
+            parts.append('        break;\n')
+        parts.append('    }\n    return jsUndefined();\n}\n\n')
+    parts.append('} // namespace JSC\n')
+    return ''.join(parts)
+
+def largest_cpp_files(source_dir, count):
+    cpp_files = Instrument.get_cpp_files(source_dir)
+    cpp_files.sort(key=os.path.getsize, reverse=True)
+    return cpp_files[:count]
+
+def run_once(content, filename, analyzer):
+    lines = io.StringIO(Instrument.add_instrumentation_include(content)).readlines()
+    start_time = time.perf_counter()
+    modified_content = Instrument.modify_functions(lines, filename, analyzer)
+    return modified_content, time.perf_counter() - start_time
+
+def bench(name, content, filename):
+    reference, reference_time = run_once(content, filename, Instrument.ScanRanges)
+    linear, linear_time = run_once(content, filename, Instrument.FunctionRanges)
+    identical = reference == linear
+    print(f"{name}: {content.count(chr(10))} lines, {len(reference[1])} sites, "
+          f"rescan {reference_time:.2f}s, one-pass {linear_time:.2f}s "
+          f"({reference_time / linear_time:.1f}x), identical output: {identical}")
+    return identical
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the function-range analysis of Instrument.py.')
+    parser.add_argument('--source', type=str, default=None,
+                        help='JavaScriptCore source directory; its largest .cpp files are used')
+    parser.add_argument('--top', type=int, default=5, help='Number of files to benchmark')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Also benchmark a generated file with this many long functions')
+    parser.add_argument('--cases', type=int, default=500,
+                        help='Switch cases (each with a return) per generated function')
+    args = parser.parse_args()
+
+    all_identical = True
+    if args.source:
+        for filepath in largest_cpp_files(args.source, args.top):
+            with open(filepath, 'r') as f:
+                content = f.read()
+            all_identical &= bench(os.path.relpath(filepath, args.source), content, os.path.basename(filepath))
+    if args.synthetic:
+        all_identical &= bench(f'synthetic ({args.synthetic} functions of {args.cases} cases)',
+                               synthetic_source(args.synthetic, args.cases), 'Synthetic.cpp')
+    if not all_identical:
+        raise SystemExit("Instrumented output differs between the two analyzers.")
+
+if __name__ == '__main__':
+    main()
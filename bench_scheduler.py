@@ -0,0 +1,105 @@
+import json
+import time
+import random
+import argparse
+from collections import Counter
+import scheduler
+
+# Replays the scheduler_log.jsonl of recorded campaigns against the target
+# policies: the traces each campaign read are offered again in order, and a
+# chosen function yields the outcomes its programs had in the recording, one
+# per targeting, then nothing once they are used up. Functions the campaign
+# never targeted yield the first outcome of a random recorded function.
+
+def load_campaign(path):
+    steps = []
+    outcomes = {}
+    with open(path, 'r') as f:
+        for line in f:
+            event = json.loads(line)
+            if 'observed' in event:
+                steps.append(event['observed'])
+                if event['target'] is not None:
+                    outcomes.setdefault(event['target'], []).append([0, 0.0])
+            elif event['target'] in outcomes:
+                # The programs of a targeting count as one outcome. With
+                # --jobs they can come after targetings of other functions,
+                # so they go to the latest targeting of their own.
+                outcomes[event['target']][-1][0] += event['new_edges']
+                outcomes[event['target']][-1][1] += event['cost']
+    return steps, outcomes
+
+def choose(policy, target_scheduler, observed):
+    if not observed:
+        return None
+    if policy == 'newest':
+        return list(observed)[-1]
+    if policy == 'random':
+        return random.choice(list(observed))
+    return target_scheduler.choose(observed)
+
+def replay(steps, outcomes, policy, seed):
+    random.seed(seed)
+    first_outcomes = [runs[0] for runs in outcomes.values()]
+    unrecorded = {}
+    used = Counter()
+    picks = Counter()
+    target_scheduler = scheduler.TargetScheduler(policy) if policy in scheduler.POLICIES else None
+    new_edges = 0
+    cost = 0.0
+    fallbacks = 0
+    decision_time = 0.0
+
+    for observed in steps:
+        start_time = time.perf_counter()
+        target = choose(policy, target_scheduler, observed)
+        decision_time += time.perf_counter() - start_time
+        if target_scheduler is not None:
+            target_scheduler.assign(target, observed)
+        if target is None:
+            fallbacks += 1
+            continue
+
+        picks[target] += 1
+        if target in outcomes:
+            runs = outcomes[target]
+        else:
+            if target not in unrecorded:
+                unrecorded[target] = [random.choice(first_outcomes)] if first_outcomes else []
+            runs = unrecorded[target]
+        edges, seconds = runs[used[target]] if used[target] < len(runs) else (0, 0.0)
+        used[target] += 1
+        new_edges += edges
+        cost += seconds
+        if target_scheduler is not None:
+            target_scheduler.record(target, edges, seconds)
+
+    top = sum(count for _, count in picks.most_common(5))
+    return {
+        'new_edges': new_edges,
+        'cost': cost,
+        'fallbacks': fallbacks,
+        'distinct': len(picks),
+        'top5_share': top / max(sum(picks.values()), 1),
+        'decision_us': decision_time / max(len(steps), 1) * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded campaigns against the target scheduling policies.')
+    parser.add_argument('logs', nargs='+', help=f'{scheduler.SCHEDULER_LOG_FILENAME} files of earlier campaigns')
+    parser.add_argument('--seeds', type=int, default=5, help='Replays per policy and campaign')
+    args = parser.parse_args()
+
+    policies = ('newest', 'random') + scheduler.POLICIES
+    for path in args.logs:
+        steps, outcomes = load_campaign(path)
+        print(f"{path}: {len(steps)} targetings of {len(outcomes)} functions")
+        for policy in policies:
+            results = [replay(steps, outcomes, policy, seed) for seed in range(args.seeds)]
+            average = {key: sum(result[key] for result in results) / len(results) for key in results[0]}
+            print(f"  {policy:>8}: {average['new_edges']:.1f} new edges, {average['cost']:.1f}s, "
+                  f"{average['distinct']:.1f} functions, top-5 share {average['top5_share']:.2f}, "
+                  f"{average['fallbacks']:.1f} random fallbacks, {average['decision_us']:.1f}us per decision")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import os
+import fuzz
+import corpus
+import checkpoint
+from dedup_cache import ProgramCache, ResponseCache, PROGRAM_CACHE_FILENAME
+
+# State of a campaign shared by generate.py, parallel.py and pipeline.py.
+# generate.py also runs as the script itself, so it keeps none of it.
+
+# Optional caches, set up by configure_caches().
+program_cache = None
+response_cache = None
+replay_only = False
+# Coverage-minimized mutation corpus, set up by configure_corpus().
+mutation_corpus = None
+# Checkpoints of state.json and its journal, set up by configure_checkpoint().
+state_checkpoint = None
+
+def configure_caches(output_folder, dedup, response_cache_path=None, response_cache_mb=256, replay=False):
+    global program_cache
+    global response_cache
+    global replay_only
+    if dedup:
+        program_cache = ProgramCache(os.path.join(output_folder, PROGRAM_CACHE_FILENAME))
+    if response_cache_path:
+        response_cache = ResponseCache(response_cache_path, response_cache_mb * 1024 * 1024)
+    replay_only = replay
+
+def configure_corpus(output_folder):
+    global mutation_corpus
+    mutation_corpus = corpus.Corpus(os.path.join(output_folder, corpus.CORPUS_DIRNAME), fuzz.COVERAGE_MAP_SIZE * 8)
+    if mutation_corpus.load():
+        print(f"Loaded corpus of {len(mutation_corpus.entries)} programs, "
+              f"{len(mutation_corpus.favored())} favored.")
+
+def configure_checkpoint(state_file, interval, resume):
+    # Returns the state to resume from, or None.
+    global state_checkpoint
+    state_checkpoint = checkpoint.Checkpoint(state_file, interval, resume)
+    return state_checkpoint.load() if resume else None
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import atexit
+
+STATE_FILENAME = 'state.json'
+JOURNAL_FILENAME = 'state_journal.jsonl'
+CHECKPOINT_INTERVAL = 5
+# The journal is rewritten once it holds this many entries per live one.
+COMPACT_RATIO = 4
+COMPACT_MINIMUM = 10000
+
+def write_atomic(path, state):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def read_journal(journal_path):
+    # used_files_set, mutate_js_files and the target scheduler statistics as
+    # of the last complete entry, the number of entries and the length of the
+    # journal up to that entry.
+    used_files_set, mutate_js_files, stats, entries, length = set(), [], {}, 0, 0
+    if not os.path.exists(journal_path):
+        return used_files_set, mutate_js_files, stats, entries, length
+    with open(journal_path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if 'used' in entry:
+                used_files_set.add(entry['used'])
+            elif 'mutate' in entry:
+                mutate_js_files.append(entry['mutate'])
+            elif 'target' in entry:
+                stats[entry['target']] = entry['stats']
+            elif entry.get('reset') == 'used':
+                used_files_set.clear()
+            elif entry.get('reset') == 'mutate':
+                mutate_js_files.clear()
+            entries += 1
+            length += len(line)
+    return used_files_set, mutate_js_files, stats, entries, length
+
+def journal_entries(used_files, mutate_js_files, stats):
+    return ([{'used': path} for path in used_files] + [{'mutate': path} for path in mutate_js_files] +
+            [{'target': key, 'stats': entry} for key, entry in stats.items()])
+
+# used_files_set of a campaign: a set that keeps what was added to it since
+# the last checkpoint, so sync() journals only that.
+class JournaledSet(set):
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.added = []
+        self.cleared = False
+
+    def add(self, item):
+        if item not in self:
+            self.added.append(item)
+            super().add(item)
+
+    def clear(self):
+        super().clear()
+        self.added = []
+        self.cleared = True
+
+    def take_changes(self):
+        cleared, added = self.cleared, self.added
+        self.added = []
+        self.cleared = False
+        return cleared, added
+
+# Checkpoints of a campaign: state.json holds the iteration, the slots, the
+# dump cursor and the scheduler clock, and is replaced atomically at most
+# every interval seconds (and at exit). used_files_set, mutate_js_files and
+# the per-function statistics of the target scheduler only go to
+# state_journal.jsonl, one line per file added, a reset line when a
+# collection starts over and one line per function whose statistics changed,
+# so a checkpoint writes only what changed since the last one. The journal is
+# compacted when it is mostly stale entries.
+class Checkpoint:
+
+    def __init__(self, state_file, interval=CHECKPOINT_INTERVAL, resume=True):
+        self.state_file = state_file
+        self.journal_path = os.path.join(os.path.dirname(state_file), JOURNAL_FILENAME)
+        self.interval = interval
+        self.last_save = 0
+        self.pending = None
+        if not resume and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journaled_used, self.restored_mutate, self.restored_stats, self.entries, length = \
+            read_journal(self.journal_path)
+        # Scheduler version up to which its statistics are journaled, None
+        # while none of them are.
+        self.scheduler_version = 0
+        # The journaled mutate_js_files are only kept for load().
+        self.journaled_mutate_count = len(self.restored_mutate)
+        self.journaled_last = self.restored_mutate[-1] if self.restored_mutate else None
+        self.journal = open(self.journal_path, 'a')
+        # Drop a torn last line.
+        self.journal.truncate(length)
+        atexit.register(self.close)
+
+    def load(self):
+        # The saved state with both collections, or None without one.
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, 'r') as f:
+            state = json.load(f)
+        # state.json of older versions still holds the collections.
+        state.setdefault('used_files_set', list(self.journaled_used))
+        state.setdefault('mutate_js_files', self.restored_mutate)
+        if 'scheduler' in state:
+            if 'stats' in state['scheduler']:
+                self.scheduler_version = None
+            state['scheduler'].setdefault('stats', self.restored_stats)
+        self.restored_mutate = None
+        self.restored_stats = None
+        return state
+
+    def append(self, entries):
+        for entry in entries:
+            self.journal.write(json.dumps(entry) + '\n')
+        self.entries += len(entries)
+
+    def sync(self, used_files_set, mutate_js_files, target_scheduler=None):
+        # used_files_set is a JournaledSet. The first sync compares it with
+        # the journal as read at startup, later ones take its changes.
+        entries = []
+        cleared, added = used_files_set.take_changes()
+        if self.journaled_used is not None:
+            cleared = not self.journaled_used <= used_files_set
+            added = used_files_set if cleared else used_files_set - self.journaled_used
+            self.journaled_used = None
+        if cleared:
+            entries.append({'reset': 'used'})
+        entries += [{'used': path} for path in added]
+
+        # mutate_js_files only grows, unless it was replaced as a whole.
+        count = self.journaled_mutate_count
+        if len(mutate_js_files) < count or (count and mutate_js_files[count - 1] != self.journaled_last):
+            entries.append({'reset': 'mutate'})
+            count = 0
+        entries += [{'mutate': path} for path in mutate_js_files[count:]]
+        self.journaled_mutate_count = len(mutate_js_files)
+        self.journaled_last = mutate_js_files[-1] if mutate_js_files else None
+
+        stats = {}
+        if target_scheduler is not None:
+            changes = target_scheduler.changes(self.scheduler_version)
+            entries += [{'target': key, 'stats': entry} for key, entry in changes['stats'].items()]
+            self.scheduler_version = changes['version']
+            stats = target_scheduler.stats
+
+        live = len(used_files_set) + len(mutate_js_files) + len(stats)
+        if self.entries + len(entries) > max(COMPACT_RATIO * live, COMPACT_MINIMUM):
+            self.compact(used_files_set, mutate_js_files, stats)
+        elif entries:
+            self.append(entries)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def compact(self, used_files_set, mutate_js_files, stats):
+        self.journal.close()
+        with open(self.journal_path + '.tmp', 'w') as f:
+            for entry in journal_entries(used_files_set, mutate_js_files, stats):
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.journal_path + '.tmp', self.journal_path)
+        self.journal = open(self.journal_path, 'a')
+        self.entries = len(used_files_set) + len(mutate_js_files) + len(stats)
+
+    def save(self, state, used_files_set, mutate_js_files, target_scheduler=None, force=False):
+        # Journal first: entries ahead of state.json are harmless on resume.
+        self.pending = (state, used_files_set, mutate_js_files, target_scheduler)
+        if not force and time.time() - self.last_save < self.interval:
+            return False
+        self.sync(used_files_set, mutate_js_files, target_scheduler)
+        write_atomic(self.state_file, state)
+        self.pending = None
+        self.last_save = time.time()
+        return True
+
+    def close(self):
+        if self.journal.closed:
+            return
+        if self.pending is not None:
+            self.save(*self.pending, force=True)
+        self.journal.close()
@@ -0,0 +1,181 @@
+import os
+import glob
+import json
+import random
+import argparse
+import numpy as np
+import fuzz
+from coverage_map import sparse_coverage, edge_ids
+
+CORPUS_DIRNAME = 'corpus'
+ENTRIES_FILENAME = 'entries.json'
+
+# Programs that found new coverage, minimized the way afl-cmin does it. Every
+# edge is owned by the cheapest entry (execution time * size) that covers it
+# and an entry that no longer owns any edge is dropped, so the corpus never
+# holds more entries than there are covered edges. The favored entries are a
+# subset that still covers every edge, picked cheapest first; mutate mode
+# selects from them. Edge sets are kept as sorted uint32 arrays in
+# <output>/corpus/<id>.npy, the entries in entries.json.
+class Corpus:
+
+    def __init__(self, directory, edge_count):
+        self.directory = directory
+        self.entries = {}
+        self.edges = {}
+        self.owned = {}
+        self.top_rated = np.full(edge_count, -1, dtype=np.int32)
+        self.costs = np.zeros(1024)
+        self.next_id = 0
+        self._favored = None
+        self._covered = None
+
+    def load(self):
+        entries_path = os.path.join(self.directory, ENTRIES_FILENAME)
+        if not os.path.exists(entries_path):
+            return 0
+        with open(entries_path, 'r') as f:
+            stored = json.load(f)
+        self.next_id = stored['next_id']
+        pruned = []
+        for entry in stored['entries']:
+            edges = np.load(os.path.join(self.directory, f"{entry['id']}.npy"))
+            culled = self.insert(entry['id'], entry['path'], edges, entry['cost'])
+            if culled is None:
+                pruned.append(entry['id'])
+                continue
+            pruned += culled
+            self.entries[entry['id']]['picks'] = entry.get('picks', 0)
+        # Entries that lost all their edges to cheaper ones while loading.
+        if pruned:
+            for entry_id in pruned:
+                self.delete_edges(entry_id)
+            self.save()
+        return len(self.entries)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries_path = os.path.join(self.directory, ENTRIES_FILENAME)
+        entries = [{'id': entry_id, **entry} for entry_id, entry in self.entries.items()]
+        with open(entries_path + '.tmp', 'w') as f:
+            json.dump({'next_id': self.next_id, 'entries': entries}, f)
+        os.replace(entries_path + '.tmp', entries_path)
+
+    def insert(self, entry_id, path, edges, cost):
+        # Takes the edges on which entry_id is cheaper than their owner.
+        # Returns the entries left without edges, or None if entry_id
+        # itself owns nothing.
+        current = self.top_rated[edges]
+        better = current < 0
+        owned = ~better
+        better[owned] = self.costs[current[owned]] > cost
+        if not better.any():
+            return None
+        if entry_id >= len(self.costs):
+            self.costs = np.concatenate([self.costs, np.zeros(entry_id + 1)])
+        self.costs[entry_id] = cost
+        self.top_rated[edges[better]] = entry_id
+        self.entries[entry_id] = {'path': path, 'cost': cost}
+        self.edges[entry_id] = edges
+        self.owned[entry_id] = int(better.sum())
+        self._favored = None
+
+        culled = []
+        displaced = current[better]
+        displaced_ids, counts = np.unique(displaced[displaced >= 0], return_counts=True)
+        for displaced_id, count in zip(displaced_ids.tolist(), counts.tolist()):
+            self.owned[displaced_id] -= count
+            if self.owned[displaced_id] == 0:
+                culled.append(displaced_id)
+                self.remove(displaced_id)
+        return culled
+
+    def add(self, path, edges, cost):
+        entry_id = self.next_id
+        culled = self.insert(entry_id, path, edges, cost)
+        if culled is None:
+            return False
+        self.next_id += 1
+        os.makedirs(self.directory, exist_ok=True)
+        np.save(os.path.join(self.directory, f'{entry_id}.npy'), edges)
+        for culled_id in culled:
+            self.delete_edges(culled_id)
+        self.save()
+        return True
+
+    def delete_edges(self, entry_id):
+        edges_path = os.path.join(self.directory, f'{entry_id}.npy')
+        if os.path.exists(edges_path):
+            os.remove(edges_path)
+
+    def remove(self, entry_id):
+        edges = self.edges.pop(entry_id)
+        self.top_rated[edges[self.top_rated[edges] == entry_id]] = -1
+        del self.entries[entry_id]
+        del self.owned[entry_id]
+        self._favored = None
+
+    def favored(self):
+        if self._favored is None:
+            if self._covered is None:
+                self._covered = np.zeros(len(self.top_rated), dtype=bool)
+            covered = self._covered
+            covered[:] = False
+            favored = []
+            for entry_id in sorted(self.entries, key=lambda entry_id: self.entries[entry_id]['cost']):
+                edges = self.edges[entry_id]
+                if not covered[edges[self.top_rated[edges] == entry_id]].all():
+                    favored.append(entry_id)
+                    covered[edges] = True
+            self._favored = favored
+        return self._favored
+
+    def select(self):
+        # A favored entry that was never selected, else any favored one.
+        favored = self.favored()
+        while favored:
+            pending = [entry_id for entry_id in favored if not self.entries[entry_id].get('picks')]
+            entry_id = random.choice(pending or favored)
+            entry = self.entries[entry_id]
+            if os.path.exists(entry['path']):
+                entry['picks'] = entry.get('picks', 0) + 1
+                return entry['path']
+            print(f"Dropping missing corpus entry {entry['path']}")
+            self.remove(entry_id)
+            self.delete_edges(entry_id)
+            self.save()
+            favored = self.favored()
+        return None
+
+def minimize_outputs(output_folder, coverage_path):
+    # Builds the corpus from the generated_*.js of earlier campaigns by
+    # running each of them with the coverage JSC, like afl-cmin.
+    corpus = Corpus(os.path.join(output_folder, CORPUS_DIRNAME), fuzz.COVERAGE_MAP_SIZE * 8)
+    corpus.load()
+    known = {entry['path'] for entry in corpus.entries.values()}
+    region = fuzz.get_coverage_region()
+    env = os.environ.copy()
+    env['SHM_ID'] = region.name
+    try:
+        js_files = sorted(glob.glob(os.path.join(output_folder, 'generated_*.js')))
+        for js_filepath in js_files:
+            if js_filepath in known:
+                continue
+            with open(js_filepath, 'r') as f:
+                javascript_code = f.read()
+            region.reset()
+            jsc_status, stdout, stderr, execution_time = fuzz.spawn_test(javascript_code, coverage_path, env)
+            indices, values = sparse_coverage(region.mapfile)
+            if len(indices):
+                corpus.add(js_filepath, edge_ids(indices, values), execution_time * len(javascript_code))
+    finally:
+        region.release()
+    print(f"{len(js_files)} programs, {len(corpus.entries)} corpus entries, {len(corpus.favored())} favored.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the mutation corpus from the programs of earlier campaigns.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder holding the generated_*.js files')
+    parser.add_argument('--coverage-path', type=str, required=True,
+                        help='Path to the IR-based instrumented JSC (Fuzzilli) for coverage')
+    args = parser.parse_args()
+    minimize_outputs(args.log, args.coverage_path)
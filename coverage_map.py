@@ -0,0 +1,70 @@
+import numpy as np
+
+# Number of set bits for every possible byte value.
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def popcount(array):
+    if array.size == 0:
+        return 0
+    return int(POPCOUNT_TABLE[array].sum(dtype=np.int64))
+
+def sparse_coverage(run_coverage):
+    # Compact (indices, values) form of a run's map, cheap to send between processes.
+    run = np.frombuffer(run_coverage, dtype=np.uint8)
+    try:
+        hit = np.flatnonzero(run)
+        values = run[hit]
+    finally:
+        del run
+    return hit.astype(np.uint32), values
+
+def edge_ids(indices, values):
+    # Sorted edge numbers (byte index * 8 + bit) of a sparse_coverage() pair.
+    bits = np.unpackbits(np.asarray(values, dtype=np.uint8)[:, None], axis=1, bitorder='little')
+    rows, columns = np.nonzero(bits)
+    return (indices[rows].astype(np.uint32) * 8 + columns.astype(np.uint32)).astype(np.uint32)
+
+# Cumulative edge bitmap: a bytearray with a NumPy view on top. The cumulative
+# popcount is maintained by merge(), so nothing has to rescan the whole map.
+class CoverageMap:
+
+    def __init__(self, size, data=None, bits=None):
+        # bits: an existing uint8 array (e.g. an np.memmap) to use in place.
+        self.size = size
+        if bits is not None:
+            self.buffer = bits
+            self.bits = bits
+        else:
+            self.buffer = bytearray(size) if data is None else bytearray(data)
+            self.bits = np.frombuffer(self.buffer, dtype=np.uint8)
+        self.edges_covered = popcount(self.bits) if data is not None or bits is not None else 0
+        # Byte indices and newly set bits of the last merge that found edges.
+        self.new_indices = None
+        self.new_bits = None
+
+    def merge(self, run_coverage):
+        # run_coverage may be an mmap, bytes or ndarray (read in place, without
+        # a copy) or an (indices, values) pair from sparse_coverage().
+        if isinstance(run_coverage, tuple):
+            return self.merge_sparse(*run_coverage)
+        run = np.frombuffer(run_coverage, dtype=np.uint8, count=self.size)
+        try:
+            hit = np.flatnonzero(run)
+            values = run[hit]
+        finally:
+            del run
+        return self.merge_sparse(hit, values)
+
+    def merge_sparse(self, indices, values):
+        if len(indices) == 0:
+            return 0
+        current = self.bits[indices]
+        new_bits = values & ~current
+        new_edges = popcount(new_bits)
+        if new_edges:
+            self.bits[indices] = current | values
+            self.edges_covered += new_edges
+            changed = new_bits != 0
+            self.new_indices = indices[changed]
+            self.new_bits = new_bits[changed]
+        return new_edges
@@ -0,0 +1,162 @@
+import os
+import time
+import atexit
+import argparse
+import numpy as np
+from coverage_map import CoverageMap, edge_ids, popcount
+
+COVERAGE_BITMAP_FILENAME = 'coverage_bitmap.dat'
+EDGE_LOG_FILENAME = 'coverage_edges.log'
+FLUSH_INTERVAL = 30
+
+# One record per coverage run that found edges: the iteration and the number
+# of edges, followed by that many little-endian u32 edge numbers.
+EDGE_RECORD_DTYPE = np.dtype([('iteration', '<u8'), ('count', '<u4')])
+# Iteration of the record holding the edges of a bitmap that predates the log.
+BASELINE_ITERATION = np.iinfo(np.uint64).max
+
+def read_edge_log(log_path):
+    # (iterations, edge counts, edges) of all complete records, the edges
+    # concatenated, and the length of the log up to the last of them.
+    if not os.path.exists(log_path):
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32), 0
+    data = np.fromfile(log_path, dtype=np.uint8)
+    iterations, counts, edge_chunks = [], [], []
+    offset = 0
+    while offset + EDGE_RECORD_DTYPE.itemsize <= len(data):
+        header = data[offset:offset + EDGE_RECORD_DTYPE.itemsize].view(EDGE_RECORD_DTYPE)[0]
+        start = offset + EDGE_RECORD_DTYPE.itemsize
+        end = start + int(header['count']) * 4
+        if end > len(data):
+            # Torn last record of a killed campaign.
+            break
+        iterations.append(int(header['iteration']))
+        counts.append(int(header['count']))
+        edge_chunks.append(data[start:end].view('<u4'))
+        offset = end
+    edges = np.concatenate(edge_chunks) if edge_chunks else np.zeros(0, dtype=np.uint32)
+    return np.array(iterations, dtype=np.uint64), np.array(counts, dtype=np.uint32), edges, offset
+
+def bitmap_from_edges(edges, size):
+    bitmap = np.zeros(size, dtype=np.uint8)
+    np.bitwise_or.at(bitmap, edges >> 3, (1 << (edges & 7)).astype(np.uint8))
+    return bitmap
+
+def rebuild_bitmap(log_path, size, until_iteration=None):
+    # The global bitmap as it was after until_iteration (all of it if None).
+    iterations, counts, edges, _ = read_edge_log(log_path)
+    if until_iteration is not None:
+        keep = (iterations <= until_iteration) | (iterations == BASELINE_ITERATION)
+        edges = edges[np.repeat(keep, counts)]
+    return bitmap_from_edges(edges, size)
+
+def edge_finders(log_path, edges):
+    # Iteration of the run that found each of the given edges, -1 if none did.
+    iterations, counts, logged, _ = read_edge_log(log_path)
+    finders = np.repeat(iterations.astype(np.int64), counts)
+    finders[np.repeat(iterations == BASELINE_ITERATION, counts)] = -1
+    order = np.argsort(logged)
+    logged, finders = logged[order], finders[order]
+    positions = np.searchsorted(logged, edges)
+    found = positions < len(logged)
+    found[found] = logged[positions[found]] == edges[found]
+    result = np.full(len(edges), -1, dtype=np.int64)
+    result[found] = finders[positions[found]]
+    return result
+
+# The global coverage of a campaign on disk: coverage_bitmap.dat, mapped with
+# np.memmap and used in place by the CoverageMap, and coverage_edges.log, the
+# append-only list of the edges each iteration found. Runs without new edges
+# write nothing; the bitmap is flushed at most every FLUSH_INTERVAL seconds,
+# since it can be rebuilt from the log.
+class CoverageStore:
+
+    def __init__(self, output_folder, size, flush_interval=FLUSH_INTERVAL):
+        self.size = size
+        self.flush_interval = flush_interval
+        self.bitmap_path = os.path.join(output_folder, COVERAGE_BITMAP_FILENAME)
+        self.log_path = os.path.join(output_folder, EDGE_LOG_FILENAME)
+        self.last_flush = time.time()
+        self.dirty = False
+        _, counts, edges, length = read_edge_log(self.log_path)
+        self.logged_edges = int(counts.sum())
+        self.log_file = open(self.log_path, 'ab')
+        # Drop a torn last record.
+        self.log_file.truncate(length)
+        self.bitmap = self.open_bitmap(edges)
+        self.coverage = CoverageMap(size, bits=self.bitmap)
+        if self.coverage.edges_covered > self.logged_edges:
+            # Edges of a bitmap that predates the log or was flushed after
+            # the last complete record.
+            self.append(BASELINE_ITERATION, np.setdiff1d(edge_ids(*self.nonzero()), edges))
+        atexit.register(self.close)
+
+    def nonzero(self):
+        indices = np.flatnonzero(self.bitmap).astype(np.uint32)
+        return indices, self.bitmap[indices]
+
+    def open_bitmap(self, logged):
+        if os.path.exists(self.bitmap_path) and os.path.getsize(self.bitmap_path) != self.size:
+            print(f"Coverage bitmap size mismatch: expected {self.size}, got {os.path.getsize(self.bitmap_path)}")
+            os.remove(self.bitmap_path)
+        if os.path.exists(self.bitmap_path):
+            bitmap = np.memmap(self.bitmap_path, dtype=np.uint8, mode='r+', shape=(self.size,))
+            covered = popcount(bitmap)
+            if covered > self.logged_edges:
+                bitmap |= bitmap_from_edges(logged, self.size)
+                return bitmap
+            if covered == self.logged_edges:
+                return bitmap
+            print("Coverage bitmap is behind the edge log. Rebuilding it.")
+        else:
+            bitmap = np.memmap(self.bitmap_path, dtype=np.uint8, mode='w+', shape=(self.size,))
+        bitmap[:] = bitmap_from_edges(logged, self.size)
+        bitmap.flush()
+        return bitmap
+
+    def append(self, iteration, edges):
+        header = np.array([(iteration, len(edges))], dtype=EDGE_RECORD_DTYPE)
+        self.log_file.write(header.tobytes() + edges.astype('<u4').tobytes())
+        self.log_file.flush()
+        self.logged_edges += len(edges)
+
+    def record(self, iteration, new_edges):
+        # After coverage.merge(): logs the edges it found.
+        if new_edges:
+            self.append(iteration, edge_ids(self.coverage.new_indices, self.coverage.new_bits))
+            self.dirty = True
+        if self.dirty and time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.bitmap.flush()
+        self.dirty = False
+        self.last_flush = time.time()
+
+    def close(self):
+        if self.log_file.closed:
+            return
+        self.flush()
+        self.log_file.close()
+
+if __name__ == '__main__':
+    import fuzz
+    parser = argparse.ArgumentParser(description='Inspect or rebuild the coverage of a campaign from its edge log.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder of the campaign')
+    parser.add_argument('--rebuild', action='store_true', help=f'Rewrite {COVERAGE_BITMAP_FILENAME} from the edge log')
+    parser.add_argument('--until', type=int, default=None,
+                        help='Only use the edges found up to this iteration (written to coverage_bitmap_<N>.dat)')
+    parser.add_argument('--edges', type=int, nargs='+', default=None, help='Print the iteration that found each edge')
+    args = parser.parse_args()
+
+    log_path = os.path.join(args.log, EDGE_LOG_FILENAME)
+    iterations, counts, edges, _ = read_edge_log(log_path)
+    print(f"{len(iterations)} coverage runs found {int(counts.sum())} edges.")
+    if args.edges:
+        for edge, finder in zip(args.edges, edge_finders(log_path, np.array(args.edges, dtype=np.uint32))):
+            print(f"edge {edge}: " + (f"iteration {finder}" if finder >= 0 else "not found by a logged iteration"))
+    if args.rebuild or args.until is not None:
+        bitmap = rebuild_bitmap(log_path, fuzz.COVERAGE_MAP_SIZE, args.until)
+        name = COVERAGE_BITMAP_FILENAME if args.until is None else f'coverage_bitmap_{args.until}.dat'
+        bitmap.tofile(os.path.join(args.log, name))
+        print(f"Wrote {popcount(bitmap)} edges to {os.path.join(args.log, name)}")
@@ -0,0 +1,167 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+PROGRAM_CACHE_FILENAME = 'program_cache.sqlite'
+
+def _is_word_char(ch):
+    return ch != '' and (ch.isalnum() or ch in '_$')
+
+def normalize_js(code):
+    # Drop comments and whitespace outside string literals so that programs
+    # differing only in layout hash the same. Regex literals are not parsed;
+    # a '/' only starts a comment when followed by '/' or '*'.
+    out = []
+    i = 0
+    n = len(code)
+    while i < n:
+        ch = code[i]
+        if ch in '"\'`':
+            j = i + 1
+            while j < n and code[j] != ch:
+                j += 2 if code[j] == '\\' else 1
+            out.append(code[i:j + 1])
+            i = j + 1
+        elif code.startswith('//', i):
+            j = code.find('\n', i)
+            i = n if j == -1 else j
+        elif code.startswith('/*', i):
+            j = code.find('*/', i + 2)
+            i = n if j == -1 else j + 2
+        elif ch.isspace():
+            j = i
+            while j < n and code[j].isspace():
+                j += 1
+            # Keep one space only where it separates two word characters.
+            previous = out[-1][-1] if out else ''
+            if _is_word_char(previous) and j < n and _is_word_char(code[j]):
+                out.append(' ')
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+def program_hash(code):
+    return hashlib.sha256(normalize_js(code).encode()).hexdigest()
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
+
+# Outcome of every program seen in this campaign, keyed by program_hash().
+# A row is claimed before the program is validated or executed, so copies
+# that are already queued or running elsewhere are caught as well.
+class ProgramCache:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = _connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS programs ('
+            'hash TEXT PRIMARY KEY, '
+            'iteration INTEGER, '
+            'new_edges INTEGER, '
+            'bug_type TEXT, '
+            'hits INTEGER NOT NULL DEFAULT 0, '
+            'first_seen REAL)'
+        )
+        self.connection.commit()
+
+    def claim(self, code):
+        code_hash = program_hash(code)
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO programs (hash, first_seen) VALUES (?, ?)', (code_hash, time.time()))
+            if cursor.rowcount == 0:
+                self.connection.execute('UPDATE programs SET hits = hits + 1 WHERE hash = ?', (code_hash,))
+            self.connection.commit()
+        return cursor.rowcount == 1
+
+    def lookup(self, code):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT iteration, new_edges, bug_type, hits FROM programs WHERE hash = ?',
+                (program_hash(code),)).fetchone()
+        if row is None:
+            return None
+        return {'iteration': row[0], 'new_edges': row[1], 'bug_type': row[2], 'hits': row[3]}
+
+    def record(self, code, iteration, new_edges, bug_type):
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO programs (hash, iteration, new_edges, bug_type, first_seen) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(hash) DO UPDATE SET iteration = excluded.iteration, '
+                'new_edges = excluded.new_edges, bug_type = excluded.bug_type',
+                (program_hash(code), iteration, new_edges, bug_type, time.time()))
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+# LLM responses keyed by (model, n, prompt), evicted least recently used
+# first once the stored completions exceed max_bytes.
+class ResponseCache:
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = _connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, '
+            'contents TEXT NOT NULL, '
+            'size INTEGER NOT NULL, '
+            'last_used REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.connection.commit()
+
+    def _key(self, model, prompt, n):
+        return hashlib.sha256(f"{model}\0{n}\0{prompt}".encode()).hexdigest()
+
+    def get(self, model, prompt, n):
+        key = self._key(model, prompt, n)
+        with self.lock:
+            row = self.connection.execute('SELECT contents FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+        return json.loads(row[0])
+
+    def put(self, model, prompt, n, contents):
+        key = self._key(model, prompt, n)
+        data = json.dumps(contents)
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, contents, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time()))
+            total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total)
+            self.connection.commit()
+
+    def _evict(self, total):
+        # Trim to 90% of the bound so eviction does not run on every insert.
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute('SELECT key, size FROM responses ORDER BY last_used').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self.connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def close(self):
+        self.connection.close()
@@ -1,59 +1,18 @@
 import os
 import re
-import random
 import argparse
-import shutil
-
-def extract_function_from_file(file_path, max_lines=100):
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        code = f.read()
-
-    pattern = re.compile(
-        r'(?:^|\n)([^\n]*?)\s+([^\s]+?)\s*\(([^\)]*?)\)\s*(const)?\s*\{', re.MULTILINE)
-    matches = pattern.finditer(code)
-    functions = []
-    for match in matches:
-        start = match.start()
-        brace_count = 1
-        index = match.end()
-        while brace_count > 0 and index < len(code):
-            if code[index] == '{':
-                brace_count += 1
-            elif code[index] == '}':
-                brace_count -= 1
-            index += 1
-        function_code = code[start:index]
-        function_lines = function_code.count('\n')
-        if function_lines <= max_lines:
-            functions.append(function_code)
-    if functions:
-        return random.choice(functions)
-    else:
-        return None
-
-def get_all_cpp_files(source_dir):
-    cpp_files = []
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            if file.endswith('.cpp'):
-                cpp_files.append(os.path.join(root, file))
-    return cpp_files
+import mmap
+import functools
+import numpy as np
+import scheduler
+from function_index import get_function_index
 
 def extract_random_function(source_dir, used_files_set, max_function_length=100):
-    cpp_files = get_all_cpp_files(source_dir)
-    available_files = [f for f in cpp_files if f not in used_files_set]
-    if not available_files:
-        print("All files have been used. Resetting used_files_set.")
-        used_files_set.clear()
-        available_files = cpp_files
-
-    random.shuffle(available_files)
-    for file_path in available_files:
-        function_code = extract_function_from_file(file_path, max_function_length)
-        if function_code:
-            used_files_set.add(file_path)
-            return function_code, file_path
-    return None, None
+    return get_function_index(source_dir).random_function(used_files_set, max_function_length)
+
+def pick_random_function(source_dir, used_files_set, max_function_length=100):
+    # A random function whose file is not marked used yet.
+    return get_function_index(source_dir).pick_function(used_files_set, max_function_length)
 
 def parse_pillm_line(line):
     match_brackets = re.search(r'\(start line:\s*(\d+),\s*end line:\s*(\d+)\)', line)
@@ -69,120 +28,271 @@ def parse_pillm_line(line):
 
     return filename, start_line, end_line
 
+_source_maps = {}
+
+def get_source_map(source_dir):
+    # basename -> every path with that name, in os.walk order. Built once per
+    # process and source tree.
+    if source_dir not in _source_maps:
+        source_map = {}
+        for root, dirs, files in os.walk(source_dir):
+            # Skip the function index and Instrument.py's pristine copies.
+            dirs[:] = [d for d in dirs if not d.startswith('.pillm')]
+            for file in files:
+                source_map.setdefault(file, []).append(os.path.join(root, file))
+        _source_maps[source_dir] = source_map
+    return _source_maps[source_dir]
+
 def find_file_in_source_dir(filename, source_dir):
-    for root, dirs, files in os.walk(source_dir):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
+    candidates = get_source_map(source_dir).get(os.path.basename(filename))
+    if not candidates:
+        return None
+    if len(candidates) > 1 and os.path.basename(filename) != filename:
+        # Several files share the basename; prefer one whose path ends with
+        # the directories given in the dump.
+        suffix = os.sep + filename.lstrip('./')
+        for path in candidates:
+            if path.endswith(suffix):
+                return path
+    return candidates[0]
+
+@functools.lru_cache(maxsize=512)
+def get_line_offsets(full_path, mtime_ns, size):
+    # Byte offset of the start of every line, plus the file size at the end.
+    # The mtime and size are part of the key so edited files are re-read.
+    with open(full_path, 'rb') as f:
+        data = np.frombuffer(f.read(), dtype=np.uint8)
+    starts = np.flatnonzero(data == ord('\n')) + 1
+    if len(starts) and starts[-1] == len(data):
+        starts = starts[:-1]
+    return np.concatenate(([0], starts, [len(data)])).astype(np.int64)
 
 def extract_code_by_lines(filename, start_line, end_line, source_dir):
     full_path = find_file_in_source_dir(filename, source_dir)
     if not full_path:
         return None, None
-    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-        lines = f.readlines()
-    start_index = max(0, start_line - 1)
-    end_index = min(len(lines), end_line)
-    snippet = lines[start_index:end_index]
-    return "".join(snippet), full_path
-
-def compare_files_line_by_line(lines_record, lines_pillm):
-    i = len(lines_record) - 1
-    j = len(lines_pillm) - 1
-    while i >= 0 and j >= 0:
-        if lines_record[i].rstrip('\n') != lines_pillm[j].rstrip('\n'):
-            return j
-        i -= 1
-        j -= 1
-    if len(lines_record) != len(lines_pillm):
-        if len(lines_pillm) > len(lines_record):
-            return j
+    stat = os.stat(full_path)
+    offsets = get_line_offsets(full_path, stat.st_mtime_ns, stat.st_size)
+    line_count = len(offsets) - 1
+    start_index = min(max(0, start_line - 1), line_count)
+    end_index = min(line_count, end_line)
+    if end_index <= start_index:
+        return "", full_path
+    with open(full_path, 'rb') as f:
+        f.seek(offsets[start_index])
+        snippet = f.read(offsets[end_index] - offsets[start_index])
+    return snippet.decode('utf-8', errors='ignore').replace('\r\n', '\n'), full_path
+
+PILLM_DUMP_FILE = 'pillm_dump.txt'
+PILLM_TRACE_FILE = 'pillm_trace.bin'
+EXECUTION_PATTERN = re.compile(r'\[Execution #(\d+)\]')
+
+# pillm_trace.bin, written by the PILLM runtime at exit: a header, the path of
+# the site table, then one little-endian u64 per call holding
+# (execution index << 24) | site ID, oldest first.
+TRACE_MAGIC = b'PILLMTRC'
+TRACE_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('records_offset', '<u4'),
+    ('total', '<u8'),
+    ('count', '<u4'),
+    ('sites_path_length', '<u4'),
+])
+SITE_ID_BITS = 24
+
+# PILLMSites.tbl as written by Instrument.py, one record per site ID.
+SITE_DTYPE = np.dtype([
+    ('start_line', '<i4'),
+    ('end_line', '<i4'),
+    ('file_name', 'S124'),
+    ('function_name', 'S124'),
+])
+
+def read_pillm_trace(trace_file):
+    # Returns the records as a read-only view of the mapped file and the path
+    # of the site table, or (None, None) for a missing or truncated trace.
+    try:
+        with open(trace_file, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None, None
+    if len(data) < TRACE_HEADER_DTYPE.itemsize:
+        return None, None
+    header = np.frombuffer(data, dtype=TRACE_HEADER_DTYPE, count=1)[0]
+    end = int(header['records_offset']) + int(header['count']) * 8
+    if header['magic'] != TRACE_MAGIC or len(data) < end:
+        return None, None
+    path_start = TRACE_HEADER_DTYPE.itemsize
+    sites_path = data[path_start:path_start + int(header['sites_path_length'])].decode(errors='replace')
+    records = np.frombuffer(data, dtype='<u8', count=int(header['count']), offset=int(header['records_offset']))
+    return records, sites_path
+
+def trace_executions(records):
+    return records >> np.uint64(SITE_ID_BITS)
+
+def trace_sites(records):
+    return records & np.uint64((1 << SITE_ID_BITS) - 1)
+
+@functools.lru_cache(maxsize=4)
+def _site_table(sites_path, mtime_ns):
+    return np.memmap(sites_path, dtype=SITE_DTYPE, mode='r')
+
+def load_site_table(sites_path):
+    try:
+        return _site_table(sites_path, os.stat(sites_path).st_mtime_ns)
+    except (OSError, ValueError):
+        return None
+
+def lookup_site(sites_path, site_id):
+    # (file name, start line, end line) of a site, the same fields a
+    # pillm_dump.txt line carries.
+    table = load_site_table(sites_path)
+    if table is None or site_id >= len(table):
+        return None, None, None
+    site = table[site_id]
+    filename = site['file_name'].decode(errors='replace')
+    if not filename:
+        return None, None, None
+    return filename, int(site['start_line']), int(site['end_line'])
+
+def format_trace(trace_file):
+    # Text export in the old pillm_dump.txt format.
+    records, sites_path = read_pillm_trace(trace_file)
+    if records is None:
+        return []
+    table = load_site_table(sites_path)
+    lines = []
+    for execution, site_id in zip(trace_executions(records).tolist(), trace_sites(records).tolist()):
+        if table is not None and site_id < len(table):
+            site = table[site_id]
+            lines.append(f"[Execution #{execution}] {site['file_name'].decode(errors='replace')}::"
+                         f"{site['function_name'].decode(errors='replace')} "
+                         f"(start line: {site['start_line']}, end line: {site['end_line']})\n")
         else:
-            return None
-    return None
+            lines.append(f"[Execution #{execution}] unknown::site{site_id} (start line: 0, end line: 0)\n")
+    return lines
+
+# The calls of the last trace read, oldest first, as target keys (None for
+# unknown sites). Execution indices restart with every PILLM process and each
+# run ends on the same shutdown calls, so a new trace is diffed against this
+# one from the end: the calls both traces end with are not new, the calls
+# before that shared suffix are. Kept in the fuzzer's state file by
+# generate.py.
+dump_cursor = None
+CURSOR_TAIL = 128
+
+def new_calls(calls):
+    # The calls of a trace not in its suffix shared with the previous trace,
+    # and moves the cursor to the trace.
+    global dump_cursor
+    previous = dump_cursor.get('tail', []) if dump_cursor else []
+    shared = 0
+    while shared < min(len(previous), len(calls)) and previous[-1 - shared] == calls[-1 - shared]:
+        shared += 1
+    dump_cursor = {'tail': calls[-CURSOR_TAIL:]}
+    return calls[:len(calls) - shared]
+
+def count_targets(calls):
+    # (file, start line, end line) -> number of calls, ordered by last call.
+    targets = {}
+    for key in calls:
+        if key is not None:
+            target = scheduler.parse_target_key(key)
+            targets[target] = targets.pop(target, 0) + 1
+    return targets
+
+def trace_targets(trace_file):
+    # The functions called in the new part of a pillm_trace.bin.
+    records, sites_path = read_pillm_trace(trace_file)
+    if records is None or not len(records):
+        return {}
+    site_ids, inverse = np.unique(trace_sites(records), return_inverse=True)
+    keys = []
+    for site_id in site_ids.tolist():
+        target = lookup_site(sites_path, site_id)
+        keys.append(scheduler.target_key(*target) if all(target) else None)
+    return count_targets(new_calls([keys[i] for i in inverse.tolist()]))
+
+def text_dump_targets(dump_file):
+    # pillm_dump.txt from binaries instrumented before the binary trace.
+    calls = []
+    with open(dump_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if EXECUTION_PATTERN.match(line):
+                target = parse_pillm_line(line.strip('\n'))
+                calls.append(scheduler.target_key(*target) if all(target) else None)
+    return count_targets(new_calls(calls))
+
+# Chooses among the new calls when set (--scheduler in generate.py); without
+# it the newest call is the target. last_target and last_observed describe
+# the latest extract_code_snippet() call for TargetScheduler.assign().
+target_scheduler = None
+last_target = None
+last_observed = {}
+
+def choose_target(targets):
+    if not targets:
+        return None
+    if target_scheduler is None:
+        return scheduler.target_key(*list(targets)[-1])
+    return target_scheduler.choose(last_observed)
 
 def extract_code_snippet(source_dir, used_files_set):
-    snippet = None
-    file_path = None
+    # The function behind a new call of the trace, or a random function when
+    # there is none.
+    snippet_text, full_path = extract_trace_snippet(source_dir)
+    if snippet_text:
+        return snippet_text, full_path
+    return extract_random_function(source_dir, used_files_set)
 
-    pillm_dump_file = 'pillm_dump.txt'
-    extract_record_file = 'extract_record.txt'
+def extract_trace_snippet(source_dir):
+    # The function behind a new call of the trace, or (None, None).
+    global last_target, last_observed
+    targets = {}
+    if os.path.exists(PILLM_TRACE_FILE):
+        targets = trace_targets(PILLM_TRACE_FILE)
+    elif os.path.exists(PILLM_DUMP_FILE):
+        targets = text_dump_targets(PILLM_DUMP_FILE)
+    last_observed = {scheduler.target_key(*target): calls for target, calls in targets.items()}
+    last_target = choose_target(targets)
 
-    if not os.path.exists(pillm_dump_file):
-        function_code, f_path = extract_random_function(source_dir, used_files_set)
-        if function_code:
-            snippet = function_code
-            file_path = f_path
-    else:
-        if not os.path.exists(extract_record_file):
-            with open(pillm_dump_file, 'r', encoding='utf-8') as f:
-                lines_pillm = f.readlines()
-            if not lines_pillm:
-                function_code, f_path = extract_random_function(source_dir, used_files_set)
-                if function_code:
-                    snippet = function_code
-                    file_path = f_path
-            else:
-                last_line = lines_pillm[-1].strip('\n')
-                filename, start_line, end_line = parse_pillm_line(last_line)
-                if not filename or not start_line or not end_line:
-                    function_code, f_path = extract_random_function(source_dir, used_files_set)
-                    if function_code:
-                        snippet = function_code
-                        file_path = f_path
-                else:
-                    snippet_text, full_path = extract_code_by_lines(filename, start_line, end_line, source_dir)
-                    if snippet_text:
-                        snippet = snippet_text
-                        file_path = full_path
-                    else:
-                        function_code, f_path = extract_random_function(source_dir, used_files_set)
-                        if function_code:
-                            snippet = function_code
-                            file_path = f_path
-
-            shutil.copyfile(pillm_dump_file, extract_record_file)
-        else:
-            with open(pillm_dump_file, 'r', encoding='utf-8') as f:
-                lines_pillm = f.readlines()
-            with open(extract_record_file, 'r', encoding='utf-8') as f:
-                lines_record = f.readlines()
-
-            mismatch_index = compare_files_line_by_line(lines_record, lines_pillm)
-            if mismatch_index is not None:
-                line_of_interest = lines_pillm[mismatch_index].strip('\n')
-                filename, start_line, end_line = parse_pillm_line(line_of_interest)
-                if not filename or not start_line or not end_line:
-                    function_code, f_path = extract_random_function(source_dir, used_files_set)
-                    if function_code:
-                        snippet = function_code
-                        file_path = f_path
-                else:
-                    snippet_text, full_path = extract_code_by_lines(filename, start_line, end_line, source_dir)
-                    if snippet_text:
-                        snippet = snippet_text
-                        file_path = full_path
-                    else:
-                        function_code, f_path = extract_random_function(source_dir, used_files_set)
-                        if function_code:
-                            snippet = function_code
-                            file_path = f_path
-            else:
-                function_code, f_path = extract_random_function(source_dir, used_files_set)
-                if function_code:
-                    snippet = function_code
-                    file_path = f_path
-
-            shutil.copyfile(pillm_dump_file, extract_record_file)
-
-    return snippet, file_path
+    if last_target is not None:
+        snippet_text, full_path = extract_code_by_lines(*scheduler.parse_target_key(last_target), source_dir)
+        if snippet_text:
+            return snippet_text, full_path
+        last_target = None
+    return None, None
+
+def read_dump_files():
+    # Dump files left by the PILLM run in the current directory, so that they
+    # can be handed to the process that extracts the next target.
+    dump_files = {}
+    for name in (PILLM_TRACE_FILE, PILLM_DUMP_FILE):
+        if os.path.exists(name):
+            with open(name, 'rb') as f:
+                dump_files[name] = f.read()
+    return dump_files
+
+def write_dump_files(dump_files):
+    for name, data in dump_files.items():
+        with open(name, 'wb') as f:
+            f.write(data)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
-        description='Extract code snippet from JSC source code based on pillm_dump.txt or at random.')
-    parser.add_argument('--source', type=str, required=True, help='Path to the JSC source code directory')
+        description='Extract code snippet from JSC source code based on pillm_trace.bin or at random.')
+    parser.add_argument('--source', type=str, help='Path to the JSC source code directory')
+    parser.add_argument('--export-trace', type=str, metavar='TRACE',
+                        help='Print a pillm_trace.bin in the pillm_dump.txt text format and exit')
     args = parser.parse_args()
 
+    if args.export_trace:
+        print(''.join(format_trace(args.export_trace)), end='')
+        raise SystemExit(0)
+    if not args.source:
+        parser.error('--source is required')
+
     source_dir = args.source
     used_files_set = set()
 
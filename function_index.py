@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import random
+import argparse
+import numpy as np
+
+INDEX_DIRNAME = '.pillm_function_index'
+FILES_FILENAME = 'files.json'
+FUNCTIONS_FILENAME = 'functions.npy'
+# Function names, one per row of functions.npy.
+NAMES_FILENAME = 'names.npy'
+
+# One row per function: byte range in its file, first line and line count.
+FUNCTION_DTYPE = np.dtype([
+    ('file', np.uint32),
+    ('start', np.uint64),
+    ('end', np.uint64),
+    ('line', np.uint32),
+    ('lines', np.uint32),
+])
+
+# A line ending in '<name>(<parameters>) [const] {', matched on bytes so that
+# the offsets can be used for a single seek+read later.
+FUNCTION_PATTERN = re.compile(
+    rb'(?:^|\n)([^\n]*?)\s+([^\s]+?)\s*\(([^\)]*?)\)\s*(const)?\s*\{', re.MULTILINE)
+
+def scan_file(file_path):
+    with open(file_path, 'rb') as f:
+        code = f.read()
+
+    functions = []
+    for match in FUNCTION_PATTERN.finditer(code):
+        start = match.start()
+        brace_count = 1
+        index = match.end()
+        while brace_count > 0 and index < len(code):
+            if code[index] == ord('{'):
+                brace_count += 1
+            elif code[index] == ord('}'):
+                brace_count -= 1
+            index += 1
+        line = code.count(b'\n', 0, match.start(1)) + 1
+        lines = code.count(b'\n', start, index)
+        name = match.group(2).decode('utf-8', errors='ignore')
+        functions.append((start, index, line, lines, name))
+    return functions
+
+# Every function in the .cpp files of a source tree, built once and kept in
+# <source>/.pillm_function_index. Files are rescanned only when their mtime
+# or size changed since the index was written.
+class FunctionIndex:
+
+    def __init__(self, source_dir):
+        self.source_dir = source_dir
+        self.index_dir = os.path.join(source_dir, INDEX_DIRNAME)
+        self.files = []
+        self.functions = np.zeros(0, dtype=FUNCTION_DTYPE)
+        self.names = np.zeros(0, dtype=str)
+        self._eligible = {}
+
+    def load(self):
+        files_path = os.path.join(self.index_dir, FILES_FILENAME)
+        functions_path = os.path.join(self.index_dir, FUNCTIONS_FILENAME)
+        names_path = os.path.join(self.index_dir, NAMES_FILENAME)
+        stored = {}
+        stored_functions = np.zeros(0, dtype=FUNCTION_DTYPE)
+        stored_names = np.zeros(0, dtype=str)
+        if os.path.exists(files_path) and os.path.exists(functions_path) and os.path.exists(names_path):
+            with open(files_path, 'r') as f:
+                stored_files = json.load(f)
+            stored_functions = np.load(functions_path, mmap_mode='r')
+            stored_names = np.load(names_path, mmap_mode='r')
+            for entry in stored_files:
+                stored[entry['path']] = entry
+
+        files = []
+        rows = []
+        names = []
+        rescanned = 0
+        for relative_path, stat in self._walk():
+            entry = {'path': relative_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            previous = stored.get(relative_path)
+            file_id = len(files)
+            if previous and previous['mtime_ns'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+                old_rows = stored_functions[previous['first']:previous['first'] + previous['count']].copy()
+                old_rows['file'] = file_id
+                rows.append(old_rows)
+                names.append(stored_names[previous['first']:previous['first'] + previous['count']].copy())
+            else:
+                scanned = scan_file(os.path.join(self.source_dir, relative_path))
+                new_rows = np.zeros(len(scanned), dtype=FUNCTION_DTYPE)
+                for i, (start, end, line, lines, name) in enumerate(scanned):
+                    new_rows[i] = (file_id, start, end, line, lines)
+                rows.append(new_rows)
+                names.append(np.array([function[4] for function in scanned], dtype=str))
+                rescanned += 1
+            files.append(entry)
+
+        del stored_functions, stored_names
+        functions = np.concatenate(rows) if rows else np.zeros(0, dtype=FUNCTION_DTYPE)
+        names = np.concatenate(names) if names else np.zeros(0, dtype=str)
+        first = 0
+        for entry, file_rows in zip(files, rows):
+            entry['first'] = first
+            entry['count'] = len(file_rows)
+            first += len(file_rows)
+
+        self.files = files
+        self.functions = functions
+        self.names = names
+        self._eligible = {}
+        if rescanned or len(files) != len(stored):
+            self.save()
+        return rescanned
+
+    def _walk(self):
+        for root, dirs, files in os.walk(self.source_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.pillm')]
+            for file in files:
+                if file.endswith('.cpp'):
+                    path = os.path.join(root, file)
+                    yield os.path.relpath(path, self.source_dir), os.stat(path)
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        files_path = os.path.join(self.index_dir, FILES_FILENAME)
+        functions_path = os.path.join(self.index_dir, FUNCTIONS_FILENAME)
+        np.save(functions_path + '.tmp.npy', self.functions)
+        os.replace(functions_path + '.tmp.npy', functions_path)
+        names_path = os.path.join(self.index_dir, NAMES_FILENAME)
+        np.save(names_path + '.tmp.npy', self.names)
+        os.replace(names_path + '.tmp.npy', names_path)
+        with open(files_path + '.tmp', 'w') as f:
+            json.dump(self.files, f)
+        os.replace(files_path + '.tmp', files_path)
+
+    def find(self, name):
+        # (path, first line, line count) of every function called name.
+        rows = self.functions[self.names == name]
+        return [(self.file_path(int(row['file'])), int(row['line']), int(row['lines'])) for row in rows]
+
+    def file_path(self, file_id):
+        return os.path.join(self.source_dir, self.files[file_id]['path'])
+
+    def eligible_files(self, max_lines):
+        # File ids with at least one function of at most max_lines lines.
+        if max_lines not in self._eligible:
+            short = self.functions['lines'] <= max_lines
+            self._eligible[max_lines] = np.unique(self.functions['file'][short]).tolist()
+        return self._eligible[max_lines]
+
+    def read_function(self, row):
+        with open(self.file_path(int(row['file'])), 'rb') as f:
+            f.seek(int(row['start']))
+            code = f.read(int(row['end'] - row['start']))
+        return code.decode('utf-8', errors='ignore')
+
+    def random_function(self, used_files_set, max_lines=100):
+        code, file_path = self.pick_function(used_files_set, max_lines)
+        if file_path is not None:
+            used_files_set.add(file_path)
+        return code, file_path
+
+    def pick_function(self, used_files_set, max_lines=100):
+        # A function of a file not in used_files_set, which is reset once every
+        # file was used. Marking the file used is up to the caller.
+        eligible = self.eligible_files(max_lines)
+        if not eligible:
+            return None, None
+
+        # Sample directly while most files are unused; fall back to the
+        # filtered list once the campaign has been through a large share.
+        file_id = None
+        for _ in range(16):
+            candidate = random.choice(eligible)
+            if self.file_path(candidate) not in used_files_set:
+                file_id = candidate
+                break
+        if file_id is None:
+            available = [i for i in eligible if self.file_path(i) not in used_files_set]
+            if not available:
+                print("All files have been used. Resetting used_files_set.")
+                used_files_set.clear()
+                available = eligible
+            file_id = random.choice(available)
+
+        entry = self.files[file_id]
+        rows = self.functions[entry['first']:entry['first'] + entry['count']]
+        row = random.choice(rows[rows['lines'] <= max_lines])
+        return self.read_function(row), self.file_path(file_id)
+
+_indexes = {}
+
+def get_function_index(source_dir):
+    # Loaded once per process and source tree.
+    if source_dir not in _indexes:
+        index = FunctionIndex(source_dir)
+        rescanned = index.load()
+        if rescanned:
+            print(f"Indexed {rescanned} changed .cpp files under {source_dir}.")
+        _indexes[source_dir] = index
+    return _indexes[source_dir]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or refresh the function index of a JSC source tree.')
+    parser.add_argument('--source', type=str, required=True, help='Path to the JSC source code directory')
+    parser.add_argument('--find', type=str, default=None, metavar='NAME', help='Print where the functions called NAME are')
+    args = parser.parse_args()
+
+    index = FunctionIndex(args.source)
+    rescanned = index.load()
+    print(f"{len(index.functions)} functions in {len(index.files)} files ({rescanned} files rescanned).")
+    if args.find:
+        for path, line, lines in index.find(args.find):
+            print(f"{path}:{line} ({lines} lines)")
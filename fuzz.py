@@ -1,26 +1,61 @@
 import os
 import subprocess
-import mmap
-import posix_ipc
 import tempfile
 import time
 import hashlib
 import json
 import signal
 import csv
+import re
+import threading
+from collections import Counter
 import numpy as np
-import matplotlib.pyplot as plt
+from coverage_map import CoverageMap, popcount, sparse_coverage, edge_ids
+import shm_regions
+from coverage_store import CoverageStore, COVERAGE_BITMAP_FILENAME
+import site_counters
+import extract_functions
 
 COVERAGE_MAP_SIZE = 1 << 20
 SHM_SIZE = COVERAGE_MAP_SIZE
+EXECUTION_TIMEOUT = 5
 
-COVERAGE_BITMAP_FILENAME = 'coverage_bitmap.dat'
 COVERAGE_LOG_FILENAME = 'coverage_log.csv'
-COVERAGE_HEATMAP_FILENAME = 'coverage_heatmap.png'
-
-global_coverage = bytearray(COVERAGE_MAP_SIZE)
+COVERAGE_LOG_FIELDS = [
+    'iteration',
+    'timestamp',
+    'cumulative_edges_covered',
+    'new_edges',
+    'total_possible_edges',
+    'cumulative_coverage_percentage',
+    'new_coverage_percentage',
+    'execution_time',
+    'bug_type',
+    'average_execution_time',
+    'total_crashes',
+    'total_timeouts',
+    'unique_bugs'
+]
+
+coverage = CoverageMap(COVERAGE_MAP_SIZE)
+global_coverage = coverage.buffer
 total_possible_edges = None
 iteration_count = 0
+coverage_region = None
+# On-disk coverage of the campaign, set up by load_coverage_bitmap().
+coverage_store = None
+# Crash buckets of the campaign (triage.CrashTriage), set by generate.py.
+crash_triage = None
+# Where records and the coverage log go (results_store.ResultStore), set by
+# generate.py; without one they are written as text files.
+result_store = None
+# Edges of the last coverage run that found new coverage, for the corpus.
+last_run_edges = None
+
+# Live PILLM site counters, set up by configure_pillm_counters().
+pillm_counters = None
+pillm_sites_path = None
+pillm_site_hits = None
 
 metrics = {
     'total_executions': 0,
@@ -28,32 +63,74 @@ metrics = {
     'total_crashes': 0,
     'total_timeouts': 0,
     'unique_bug_types': set(),
+    'validation_paths': Counter(),
 }
 
+# Validation runs in threads (batched candidates, the pipeline's producers),
+# so the validation path counts are only changed under this lock.
+validation_lock = threading.Lock()
+
+def count_validation_path(path):
+    with validation_lock:
+        metrics['validation_paths'][path] += 1
+
+# stderr markers that make a generated program count as invalid.
+VALIDATION_ERRORS = ('SyntaxError', 'ReferenceError')
+
 def load_coverage_bitmap(output_folder):
+    global coverage
     global global_coverage
-    coverage_bitmap_path = os.path.join(output_folder, COVERAGE_BITMAP_FILENAME)
-    if os.path.exists(coverage_bitmap_path):
-        with open(coverage_bitmap_path, 'rb') as f:
-            data = f.read()
-            if len(data) != COVERAGE_MAP_SIZE:
-                print(f"Coverage bitmap size mismatch: expected {COVERAGE_MAP_SIZE}, got {len(data)}")
-                global_coverage = bytearray(COVERAGE_MAP_SIZE)
-            else:
-                global_coverage = bytearray(data)
-        print(f"Loaded coverage bitmap from {coverage_bitmap_path}")
+    global coverage_store
+    if coverage_store is not None:
+        coverage_store.close()
+    coverage_store = CoverageStore(output_folder, COVERAGE_MAP_SIZE)
+    coverage = coverage_store.coverage
+    global_coverage = coverage.buffer
+    if coverage.edges_covered:
+        print(f"Loaded {coverage.edges_covered} covered edges from {coverage_store.bitmap_path}")
     else:
         print("No existing coverage bitmap found. Starting fresh.")
-        global_coverage = bytearray(COVERAGE_MAP_SIZE)
 
 def save_coverage_bitmap(output_folder):
     global global_coverage
+    if coverage_store is not None:
+        coverage_store.flush()
+        return
     coverage_bitmap_path = os.path.join(output_folder, COVERAGE_BITMAP_FILENAME)
     with open(coverage_bitmap_path, 'wb') as f:
         f.write(global_coverage)
 
 def count_bits(byte_array):
-    return sum(bin(byte).count('1') for byte in byte_array)
+    return popcount(np.frombuffer(byte_array, dtype=np.uint8))
+
+def is_invalid_output(stderr_decoded):
+    return any(error in stderr_decoded for error in VALIDATION_ERRORS)
+
+def count_coverage_validation(stderr_decoded, execution_time):
+    # In 'coverage' validation mode the coverage run doubles as the validity
+    # check; a rejected program is discarded without being recorded.
+    if is_invalid_output(stderr_decoded):
+        count_validation_path('coverage_discarded')
+        metrics['total_executions'] += 1
+        metrics['total_execution_time'] += execution_time
+        return False
+    count_validation_path('coverage_valid')
+    return True
+
+def report_validation_paths():
+    paths = metrics['validation_paths']
+    total = sum(paths.values())
+    if not total:
+        return
+    print("Validation paths:")
+    for path, count in sorted(paths.items()):
+        print(f"  {path}: {count} ({count / total * 100:.1f}%)")
+
+def report_bugs():
+    if crash_triage is not None and crash_triage.buckets:
+        print(f"Unique bugs: {unique_bugs()} ({len(crash_triage.buckets)} crash buckets)")
+    elif metrics['unique_bug_types']:
+        print(f"Unique bug types: {unique_bugs()}")
 
 def get_total_possible_edges(stdout_decoded):
     for line in stdout_decoded.splitlines():
@@ -66,70 +143,69 @@ def get_total_possible_edges(stdout_decoded):
     return None
 
 def append_coverage_log(output_folder, log_data):
+    if result_store is not None:
+        result_store.log_coverage(log_data)
+        return
     coverage_log_path = os.path.join(output_folder, COVERAGE_LOG_FILENAME)
     write_header = not os.path.exists(coverage_log_path)
     with open(coverage_log_path, 'a', newline='') as csvfile:
-        fieldnames = [
-            'iteration',
-            'timestamp',
-            'cumulative_edges_covered',
-            'new_edges',
-            'total_possible_edges',
-            'cumulative_coverage_percentage',
-            'new_coverage_percentage',
-            'execution_time',
-            'bug_type',
-            'average_execution_time',
-            'total_crashes',
-            'total_timeouts',
-            'unique_bugs'
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=COVERAGE_LOG_FIELDS)
         if write_header:
             writer.writeheader()
         writer.writerow(log_data)
 
-def save_coverage_heatmap(output_folder):
-    global global_coverage
-    coverage_array = np.frombuffer(global_coverage, dtype=np.uint8)
-    # For a 1 MB buffer, 1024 x 1024 is a convenient 2D layout
-    coverage_matrix = coverage_array.reshape((1024, 1024))
-    plt.figure(figsize=(10, 10))
-    plt.imshow(coverage_matrix, cmap='hot', interpolation='nearest')
-    plt.title('Coverage Heatmap')
-    plt.colorbar()
-    heatmap_path = os.path.join(output_folder, COVERAGE_HEATMAP_FILENAME)
-    plt.savefig(heatmap_path)
-    plt.close()
-    print(f"Saved coverage heatmap to {heatmap_path}")
-
-def run_test(javascript_code, output_folder, jsc_path, iteration, pillm_run=False):
-
-    global global_coverage
-    global total_possible_edges
-    global metrics
-
-    shm_name = "/FuzzilliSHM"
-    try:
-        posix_ipc.unlink_shared_memory(shm_name)
-    except posix_ipc.ExistentialError:
-        pass
-
-    if not pillm_run:
-        shm = posix_ipc.SharedMemory(shm_name, flags=posix_ipc.O_CREX, mode=0o600, size=SHM_SIZE)
-        mapfile = mmap.mmap(shm.fd, SHM_SIZE, prot=mmap.PROT_READ | mmap.PROT_WRITE)
-        shm.close_fd()
-        mapfile.seek(0)
-        mapfile.write(bytearray(COVERAGE_MAP_SIZE))
-        mapfile.flush()
-    else:
-        shm = None
-        mapfile = None
-
+def save_record(output_folder, record_filename, iteration, pillm_run, record_data):
+    # Returns the record name in the result store, or the path of the file.
+    if result_store is not None:
+        result_store.add(record_filename, iteration, pillm_run, record_data)
+        return record_filename
+    record_filepath = os.path.join(output_folder, record_filename)
+    with open(record_filepath, 'w') as record_file:
+        for key, value in record_data.items():
+            record_file.write(f"{key}: {value}\n")
+    return record_filepath
+
+def get_coverage_region():
+    # The spawn-per-test path reuses one uniquely named region per process.
+    global coverage_region
+    if coverage_region is None:
+        coverage_region = shm_regions.allocate_region(SHM_SIZE)
+    return coverage_region
+
+def configure_pillm_counters(sites_path):
+    global pillm_counters
+    global pillm_sites_path
+    global pillm_site_hits
+    site_count = site_counters.site_count_from_table(sites_path)
+    pillm_counters = site_counters.SiteCounterRegion(site_count)
+    pillm_sites_path = sites_path
+    pillm_site_hits = np.zeros(site_count, dtype=np.uint64)
+    return site_count
+
+def spawn_pillm(javascript_code, jsc_path):
+    # Returns spawn_test()'s result and, with live counters, the sites the run
+    # reached as (site IDs, hit counts).
     env = os.environ.copy()
-    if not pillm_run:
-        env['SHM_ID'] = shm_name
-
+    if pillm_counters is None:
+        return spawn_test(javascript_code, jsc_path, env), None
+
+    pillm_counters.reset()
+    env.update(pillm_counters.env())
+    result = spawn_test(javascript_code, jsc_path, env)
+    # The region survives crashes and timeouts that never reach the exit dump.
+    pillm_counters.write_trace(extract_functions.PILLM_TRACE_FILE, pillm_sites_path)
+    return result, pillm_counters.sparse_hits()
+
+def merge_site_hits(site_hits):
+    if site_hits is None or pillm_site_hits is None:
+        return
+    sites, counts = site_hits
+    new_sites = int(np.count_nonzero(pillm_site_hits[sites] == 0))
+    pillm_site_hits[sites] += counts
+    print(f"PILLM run reached {len(sites)} sites, {new_sites} new "
+          f"({np.count_nonzero(pillm_site_hits)} reached so far).")
+
+def spawn_test(javascript_code, jsc_path, env, timeout=EXECUTION_TIMEOUT):
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.js') as js_file:
         js_file.write(javascript_code)
         js_file_path = js_file.name
@@ -144,7 +220,7 @@ def run_test(javascript_code, output_folder, jsc_path, iteration, pillm_run=Fals
         )
 
         try:
-            stdout, stderr = process.communicate(timeout=5)
+            stdout, stderr = process.communicate(timeout=timeout)
             jsc_status = process.returncode
         except subprocess.TimeoutExpired:
             process.kill()
@@ -153,136 +229,191 @@ def run_test(javascript_code, output_folder, jsc_path, iteration, pillm_run=Fals
 
         end_time = time.time()
         execution_time = end_time - start_time
+    finally:
+        os.remove(js_file_path)
 
-        metrics['total_executions'] += 1
-        metrics['total_execution_time'] += execution_time
+    return jsc_status, stdout.decode(errors='replace'), stderr.decode(errors='replace'), execution_time
 
-        stdout_decoded = stdout.decode(errors='replace')
-        stderr_decoded = stderr.decode(errors='replace')
+def run_test(javascript_code, output_folder, jsc_path, iteration, pillm_run=False, executor=None,
+             discard_invalid=False):
+    global total_possible_edges
 
-        bug_type = None
-        if jsc_status == 'timeout':
-            bug_type = 'timeout'
-            metrics['total_timeouts'] += 1
-        else:
-            try:
-                jsc_status_int = int(jsc_status)
-            except ValueError:
-                jsc_status_int = -9999
-            if isinstance(jsc_status_int, int) and jsc_status_int < 0:
-                signal_num = -jsc_status_int
-                bug_type = f'crash_signal_{signal_num}'
-                metrics['total_crashes'] += 1
-            elif jsc_status_int != 0 and jsc_status_int != -9999:
-                bug_type = 'non_zero_exit'
-
-            fatal_error_keywords = ['ASSERTION FAILED', 'Fatal error', 'Segmentation fault',
-                                    'Aborted', 'Trace/BPT trap']
-            if any(keyword in stderr_decoded for keyword in fatal_error_keywords):
-                bug_type = 'fatal_error'
-                metrics['total_crashes'] += 1
-
-        if bug_type:
-            metrics['unique_bug_types'].add(bug_type)
-
-        if pillm_run:
-            record_data = {
-                'test_code': javascript_code,
-                'execution_time': execution_time,
-                'jsc_status': jsc_status,
-                'stdout': stdout_decoded,
-                'stderr': stderr_decoded,
-                'bug_type': bug_type,
-                'new_edges': 0,
-            }
-
-            timestamp = time.strftime('%Y%m%d_%H%M%S')
-            js_hash = hashlib.sha256(javascript_code.encode()).hexdigest()[:8]
-            bug_suffix = f"_{bug_type}" if bug_type else ""
-            record_filename = f'record_pillm_{timestamp}_{js_hash}{bug_suffix}.txt'
-            record_filepath = os.path.join(output_folder, record_filename)
-            with open(record_filepath, 'w') as record_file:
-                for key, value in record_data.items():
-                    record_file.write(f"{key}: {value}\n")
-
-            print(f"Saved pillm-run record to {record_filepath}")
-            return record_data
-        else:
-            if total_possible_edges is None:
-                possible_edges = get_total_possible_edges(stdout_decoded)
-                if possible_edges is None:
-                    possible_edges = COVERAGE_MAP_SIZE * 8
-                total_possible_edges = possible_edges
-                print(f"Total possible edges set to {total_possible_edges}")
-
-            mapfile.seek(0)
-            coverage_data = mapfile.read(COVERAGE_MAP_SIZE)
-
-            new_edges = 0
-            for i in range(COVERAGE_MAP_SIZE):
-                new_bits = coverage_data[i] & ~global_coverage[i]
-                new_edges += bin(new_bits).count('1')
-
-            for i in range(COVERAGE_MAP_SIZE):
-                global_coverage[i] |= coverage_data[i]
-
-            cumulative_edges_covered = count_bits(global_coverage)
-            cumulative_coverage_percentage = (cumulative_edges_covered / total_possible_edges) * 100
-            new_coverage_percentage = (new_edges / total_possible_edges) * 100
-
-            average_execution_time = metrics['total_execution_time'] / metrics['total_executions']
-
-            record_data = {
-                'test_code': javascript_code,
-                'execution_time': execution_time,
-                'jsc_status': jsc_status,
-                'cumulative_coverage': f"{cumulative_coverage_percentage:.6f}",
-                'new_coverage': f"{new_coverage_percentage:.6f}",
-                'cumulative_edges_covered': cumulative_edges_covered,
-                'new_edges': new_edges,
-                'total_possible_edges': total_possible_edges,
-                'stdout': stdout_decoded,
-                'stderr': stderr_decoded,
-                'bug_type': bug_type
-            }
-
-            timestamp = time.strftime('%Y%m%d_%H%M%S')
-            js_hash = hashlib.sha256(javascript_code.encode()).hexdigest()[:8]
-            bug_suffix = f"_{bug_type}" if bug_type else ""
-            record_filename = f'record_{timestamp}_{js_hash}{bug_suffix}.txt'
-            record_filepath = os.path.join(output_folder, record_filename)
-            with open(record_filepath, 'w') as record_file:
-                for key, value in record_data.items():
-                    record_file.write(f"{key}: {value}\n")
-
-            print(f"Saved coverage record to {record_filepath}")
+    if executor is not None and not pillm_run:
+        jsc_status, stdout_decoded, stderr_decoded, execution_time = executor.execute(javascript_code)
+        if discard_invalid and not count_coverage_validation(stderr_decoded, execution_time):
+            return None
+        if total_possible_edges is None:
+            total_possible_edges = get_total_possible_edges(executor.startup_output)
+        return process_result(javascript_code, output_folder, iteration, pillm_run,
+                              jsc_status, stdout_decoded, stderr_decoded, execution_time,
+                              executor.coverage)
 
+    if not pillm_run:
+        region = get_coverage_region()
+        region.reset()
+        mapfile = region.mapfile
+        env = os.environ.copy()
+        env['SHM_ID'] = region.name
+        jsc_status, stdout_decoded, stderr_decoded, execution_time = spawn_test(javascript_code, jsc_path, env)
+    else:
+        mapfile = None
+        (jsc_status, stdout_decoded, stderr_decoded, execution_time), site_hits = spawn_pillm(javascript_code,
+                                                                                            jsc_path)
+        merge_site_hits(site_hits)
+
+    if discard_invalid and not pillm_run and not count_coverage_validation(stderr_decoded, execution_time):
+        return None
+    return process_result(javascript_code, output_folder, iteration, pillm_run,
+                          jsc_status, stdout_decoded, stderr_decoded, execution_time,
+                          mapfile)
+
+FATAL_ERROR_KEYWORDS = ['ASSERTION FAILED', 'Fatal error', 'Segmentation fault',
+                        'Aborted', 'Trace/BPT trap']
+
+def classify_bug(jsc_status, stderr_decoded):
+    if jsc_status == 'timeout':
+        return 'timeout'
+    bug_type = None
+    try:
+        jsc_status_int = int(jsc_status)
+    except ValueError:
+        jsc_status_int = -9999
+    if jsc_status_int < 0:
+        bug_type = f'crash_signal_{-jsc_status_int}'
+    elif jsc_status_int != 0:
+        bug_type = 'non_zero_exit'
+    if any(keyword in stderr_decoded for keyword in FATAL_ERROR_KEYWORDS):
+        bug_type = 'fatal_error'
+    return bug_type
+
+def is_crash(bug_type):
+    return bug_type is not None and (bug_type == 'fatal_error' or bug_type.startswith('crash_signal_'))
+
+def unique_bugs():
+    # Crashes count once per triage bucket when there is a triage, the other
+    # bug types (timeouts, non-zero exits) once per type.
+    if crash_triage is None:
+        return len(metrics['unique_bug_types'])
+    other_types = [bug_type for bug_type in metrics['unique_bug_types'] if not is_crash(bug_type)]
+    return len(crash_triage.buckets) + len(other_types)
+
+# Keys of the record_*.txt files, in the order process_result() writes them.
+RECORD_KEY_PATTERN = re.compile(r'^(test_code|execution_time|jsc_status|cumulative_coverage|new_coverage|'
+                                r'cumulative_edges_covered|new_edges|total_possible_edges|stdout|stderr|'
+                                r'bug_type): ', re.MULTILINE)
+
+def read_record(record_filepath):
+    # The fields of a record file as strings; values may span lines.
+    with open(record_filepath, 'r', errors='replace') as f:
+        text = f.read()
+    matches = list(RECORD_KEY_PATTERN.finditer(text))
+    record = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        record.setdefault(match.group(1), text[match.end():end][:-1])
+    return record
+
+def process_result(javascript_code, output_folder, iteration, pillm_run,
+                   jsc_status, stdout_decoded, stderr_decoded, execution_time, coverage_data):
+
+    global coverage
+    global total_possible_edges
+    global metrics
+    global last_run_edges
+
+    metrics['total_executions'] += 1
+    metrics['total_execution_time'] += execution_time
+
+    bug_type = classify_bug(jsc_status, stderr_decoded)
+    if bug_type == 'timeout':
+        metrics['total_timeouts'] += 1
+    elif is_crash(bug_type):
+        metrics['total_crashes'] += 1
+
+    if bug_type:
+        metrics['unique_bug_types'].add(bug_type)
+
+    if pillm_run:
+        record_data = {
+            'test_code': javascript_code,
+            'execution_time': execution_time,
+            'jsc_status': jsc_status,
+            'stdout': stdout_decoded,
+            'stderr': stderr_decoded,
+            'bug_type': bug_type,
+            'new_edges': 0,
+        }
+
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        js_hash = hashlib.sha256(javascript_code.encode()).hexdigest()[:8]
+        bug_suffix = f"_{bug_type}" if bug_type else ""
+        record_filename = f'record_pillm_{timestamp}_{js_hash}{bug_suffix}.txt'
+        record_filepath = save_record(output_folder, record_filename, iteration, True, record_data)
+
+        print(f"Saved pillm-run record to {record_filepath}")
+        return record_data
+    else:
+        if total_possible_edges is None:
+            possible_edges = get_total_possible_edges(stdout_decoded)
+            if possible_edges is None:
+                possible_edges = COVERAGE_MAP_SIZE * 8
+            total_possible_edges = possible_edges
+            print(f"Total possible edges set to {total_possible_edges}")
+
+        run_coverage = coverage_data if isinstance(coverage_data, tuple) else sparse_coverage(coverage_data)
+        new_edges = coverage.merge(run_coverage)
+        last_run_edges = edge_ids(*run_coverage) if new_edges else None
+        cumulative_edges_covered = coverage.edges_covered
+        cumulative_coverage_percentage = (cumulative_edges_covered / total_possible_edges) * 100
+        new_coverage_percentage = (new_edges / total_possible_edges) * 100
+
+        average_execution_time = metrics['total_execution_time'] / metrics['total_executions']
+
+        record_data = {
+            'test_code': javascript_code,
+            'execution_time': execution_time,
+            'jsc_status': jsc_status,
+            'cumulative_coverage': f"{cumulative_coverage_percentage:.6f}",
+            'new_coverage': f"{new_coverage_percentage:.6f}",
+            'cumulative_edges_covered': cumulative_edges_covered,
+            'new_edges': new_edges,
+            'total_possible_edges': total_possible_edges,
+            'stdout': stdout_decoded,
+            'stderr': stderr_decoded,
+            'bug_type': bug_type
+        }
+
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        js_hash = hashlib.sha256(javascript_code.encode()).hexdigest()[:8]
+        bug_suffix = f"_{bug_type}" if bug_type else ""
+        record_filename = f'record_{timestamp}_{js_hash}{bug_suffix}.txt'
+        record_filepath = save_record(output_folder, record_filename, iteration, False, record_data)
+
+        print(f"Saved coverage record to {record_filepath}")
+        # Every program also gets a coverage run, so only those are bucketed.
+        if crash_triage is not None and is_crash(bug_type):
+            crash_triage.record(javascript_code, jsc_status, stderr_decoded, bug_type, record_filepath)
+
+        if coverage_store is not None:
+            coverage_store.record(iteration, new_edges)
+        else:
             save_coverage_bitmap(output_folder)
 
-            log_data = {
-                'iteration': iteration,
-                'timestamp': timestamp,
-                'cumulative_edges_covered': cumulative_edges_covered,
-                'new_edges': new_edges,
-                'total_possible_edges': total_possible_edges,
-                'cumulative_coverage_percentage': cumulative_coverage_percentage,
-                'new_coverage_percentage': new_coverage_percentage,
-                'execution_time': execution_time,
-                'bug_type': bug_type or '',
-                'average_execution_time': average_execution_time,
-                'total_crashes': metrics['total_crashes'],
-                'total_timeouts': metrics['total_timeouts'],
-                'unique_bugs': len(metrics['unique_bug_types'])
-            }
-            append_coverage_log(output_folder, log_data)
-
-            if iteration % 10 == 0:
-                save_coverage_heatmap(output_folder)
-
-            return record_data
-
-    finally:
-        if mapfile:
-            mapfile.close()
-            posix_ipc.unlink_shared_memory(shm_name)
-        os.remove(js_file_path)
\ No newline at end of file
+        log_data = {
+            'iteration': iteration,
+            'timestamp': timestamp,
+            'cumulative_edges_covered': cumulative_edges_covered,
+            'new_edges': new_edges,
+            'total_possible_edges': total_possible_edges,
+            'cumulative_coverage_percentage': cumulative_coverage_percentage,
+            'new_coverage_percentage': new_coverage_percentage,
+            'execution_time': execution_time,
+            'bug_type': bug_type or '',
+            'average_execution_time': average_execution_time,
+            'total_crashes': metrics['total_crashes'],
+            'total_timeouts': metrics['total_timeouts'],
+            'unique_bugs': unique_bugs()
+        }
+        append_coverage_log(output_folder, log_data)
+
+        return record_data
@@ -8,9 +8,28 @@ import subprocess
 import tempfile
 import glob
 import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import extract_functions
+import shm_regions
+import site_counters
+import scheduler
+import triage
+import coverage_store
+import reporting
+import results_store
+import checkpoint
+import campaign
+from dedup_cache import PROGRAM_CACHE_FILENAME
+from reprl import REPRLExecutor
+
+def is_code_valid(code, jsc_path, executor=None):
+    if executor is not None:
+        jsc_status, stdout_decoded, stderr_decoded, _ = executor.execute(code)
+        valid = jsc_status != 'timeout' and not fuzz.is_invalid_output(stderr_decoded)
+        fuzz.count_validation_path('exec_valid' if valid else 'exec_invalid')
+        return valid
 
-def is_code_valid(code, jsc_path):
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.js') as js_file:
         js_file.write(code)
         js_file_path = js_file.name
@@ -22,17 +41,38 @@ def is_code_valid(code, jsc_path):
         )
         stdout, stderr = process.communicate(timeout=5)
         stderr_decoded = stderr.decode(errors='replace')
-        if 'SyntaxError' in stderr_decoded or 'ReferenceError' in stderr_decoded:
+        if fuzz.is_invalid_output(stderr_decoded):
+            fuzz.count_validation_path('exec_invalid')
             return False
         else:
+            fuzz.count_validation_path('exec_valid')
             return True
     except subprocess.TimeoutExpired:
         process.kill()
+        fuzz.count_validation_path('exec_invalid')
         return False
     finally:
         os.remove(js_file_path)
 
-def generate_javascript_code(feedback, model, jsc_path, strategy, previous_code=None, extracted_function=None):
+def check_syntax(code, jsc_path, executor=None):
+    # Parse-only check through the jsc shell's checkSyntax(); nothing in the
+    # program runs, so ReferenceErrors are left to the coverage run.
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.js') as js_file:
+        js_file.write(code)
+        js_file_path = js_file.name
+    try:
+        script = f"checkSyntax({json.dumps(js_file_path)});"
+        if executor is not None:
+            jsc_status, _, stderr_decoded, _ = executor.execute(script)
+        else:
+            jsc_status, _, stderr_decoded, _ = fuzz.spawn_test(script, jsc_path, os.environ.copy())
+    finally:
+        os.remove(js_file_path)
+    valid = jsc_status != 'timeout' and 'SyntaxError' not in stderr_decoded
+    fuzz.count_validation_path('syntax_valid' if valid else 'syntax_invalid')
+    return valid
+
+def build_prompt(feedback, strategy, previous_code=None, extracted_function=None):
     if strategy == 'generate':
         prompt = (
             "Generate JavaScript code that will invoke and test the following C++ function "
@@ -74,33 +114,113 @@ def generate_javascript_code(feedback, model, jsc_path, strategy, previous_code=
             )
     else:
         raise ValueError(f"Unknown strategy: {strategy}")
+    return prompt
+
+def clean_completion(content):
+    javascript_code = content.strip()
+
+    if javascript_code.startswith('```'):
+        javascript_code = javascript_code.strip('`')
+        lines = javascript_code.split('\n')
+        if lines and lines[0].startswith('javascript'):
+            lines = lines[1:]
+        javascript_code = '\n'.join(lines)
+    return javascript_code
+
+def report_caches():
+    if campaign.response_cache is not None:
+        print(f"Response cache: {campaign.response_cache.hits} hits, {campaign.response_cache.misses} misses.")
+
+def request_completion(model, prompt, n):
+    if campaign.response_cache is not None:
+        contents = campaign.response_cache.get(model, prompt, n)
+        if contents is not None:
+            return contents
+    if campaign.replay_only:
+        print("No usable cached response for this prompt; --replay makes no API calls.")
+        return None
+
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=[{'role': 'user', 'content': prompt}],
+        max_tokens=2048,
+        n=n,
+        temperature=0.7,
+    )
+    contents = [choice['message']['content'] for choice in response['choices']]
+    if campaign.response_cache is not None:
+        campaign.response_cache.put(model, prompt, n, contents)
+    return contents
+
+def drop_known_programs(candidates):
+    # Programs whose normalized source was seen before are not run again.
+    fresh = []
+    for javascript_code in candidates:
+        if campaign.program_cache.claim(javascript_code):
+            fresh.append(javascript_code)
+        else:
+            cached = campaign.program_cache.lookup(javascript_code)
+            fuzz.count_validation_path('duplicate')
+            print(f"Skipping duplicate program (first seen in iteration {cached['iteration']}, "
+                  f"bug_type {cached['bug_type']}).")
+    return fresh
+
+def validate_candidates(candidates, jsc_path, executor=None, validation='exec'):
+    if validation == 'coverage':
+        # Checked by the coverage run itself, see fuzz.run_test(discard_invalid=True).
+        return [True] * len(candidates)
+    check = check_syntax if validation == 'syntax' else is_code_valid
+    # A persistent executor runs one script at a time; spawned validation
+    # processes are independent and run side by side.
+    if executor is not None or len(candidates) == 1:
+        return [check(code, jsc_path, executor) for code in candidates]
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        return list(pool.map(lambda code: check(code, jsc_path), candidates))
+
+def generate_javascript_candidates(feedback, model, jsc_path, strategy, previous_code=None,
+                                   extracted_function=None, executor=None, batch_size=1, validation='exec'):
+    prompt = build_prompt(feedback, strategy, previous_code, extracted_function)
 
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=[{'role': 'user', 'content': prompt}],
-                max_tokens=2048,
-                n=1,
-                temperature=0.7,
-            )
+            contents = request_completion(model, prompt, batch_size)
         except openai.error.OpenAIError as e:
             print(f"OpenAI API error: {e}")
             time.sleep(5)
             continue
+        if contents is None:
+            break
 
-        javascript_code = response['choices'][0]['message']['content'].strip()
-
-        if javascript_code.startswith('```'):
-            javascript_code = javascript_code.strip('`')
-            lines = javascript_code.split('\n')
-            if lines and lines[0].startswith('javascript'):
-                lines = lines[1:]
-            javascript_code = '\n'.join(lines)
-
-        if is_code_valid(javascript_code, jsc_path):
-            return javascript_code
+        candidates = []
+        seen_hashes = set()
+        for content in contents:
+            javascript_code = clean_completion(content)
+            code_hash = hashlib.sha256(javascript_code.encode()).hexdigest()
+            if code_hash not in seen_hashes:
+                seen_hashes.add(code_hash)
+                candidates.append(javascript_code)
+
+        if campaign.program_cache is not None:
+            candidates = drop_known_programs(candidates)
+            if not candidates:
+                # Asking again mostly repeats them again. The iteration fails
+                # instead, which counts towards switching the strategy or the
+                # mutation input.
+                print("Generated code only repeats earlier programs. Skipping the iteration.")
+                return []
+
+        valid = validate_candidates(candidates, jsc_path, executor, validation)
+        valid_candidates = [code for code, is_valid in zip(candidates, valid) if is_valid]
+        if campaign.program_cache is not None:
+            for javascript_code, is_valid in zip(candidates, valid):
+                if not is_valid:
+                    campaign.program_cache.record(javascript_code, None, 0, 'invalid')
+        if batch_size > 1:
+            print(f"Batch of {len(contents)} completions: {len(candidates)} unique, "
+                  f"{len(valid_candidates)} valid.")
+        if valid_candidates:
+            return valid_candidates
         else:
             print("Generated code has syntax errors or ReferenceErrors. Retrying...")
             prompt += (
@@ -109,14 +229,186 @@ def generate_javascript_code(feedback, model, jsc_path, strategy, previous_code=
             )
 
     print("Failed to generate syntactically valid code after multiple attempts.")
-    return None
+    return []
+
+def generate_javascript_code(feedback, model, jsc_path, strategy, previous_code=None, extracted_function=None,
+                             executor=None, validation='exec'):
+    candidates = generate_javascript_candidates(feedback, model, jsc_path, strategy, previous_code,
+                                                extracted_function, executor, validation=validation)
+    return candidates[0] if candidates else None
+
+# Characters of stdout and stderr kept in the feedback of a slot.
+FEEDBACK_OUTPUT_LIMIT = 4096
+SLOT_KEYS = ('feedback', 'no_coverage_increase_count', 'strategy', 'previous_code', 'current_mutation_file',
+             'target')
+
+def new_slot(mutate_only):
+    return {
+        'feedback': None,
+        'no_coverage_increase_count': 0,
+        'strategy': 'generate' if not mutate_only else 'mutate',
+        'previous_code': None,
+        'current_mutation_file': None,
+        'target': None,
+    }
+
+def add_to_corpus(js_filepath, javascript_code, record_data):
+    # Programs that found new edges; fuzz.last_run_edges holds their edges.
+    if campaign.mutation_corpus is None or record_data is None or not record_data.get('new_edges'):
+        return
+    if fuzz.last_run_edges is not None:
+        campaign.mutation_corpus.add(js_filepath, fuzz.last_run_edges,
+                                     record_data['execution_time'] * len(javascript_code))
+
+def choose_mutation_file(mutate_js_files):
+    # Favored corpus entries once there are any, the plain pool before.
+    if campaign.mutation_corpus is not None:
+        js_filepath = campaign.mutation_corpus.select()
+        if js_filepath:
+            return js_filepath
+        if not mutate_js_files:
+            # Every corpus entry was dropped; go back to the generated programs.
+            output_folder = os.path.dirname(campaign.mutation_corpus.directory)
+            mutate_js_files.extend(glob.glob(os.path.join(output_folder, 'generated_*.js')))
+    if not mutate_js_files:
+        return None
+    return random.choice(mutate_js_files)
+
+def track_mutation_file(mutate_js_files, js_filepath):
+    if campaign.mutation_corpus is None or not campaign.mutation_corpus.entries:
+        mutate_js_files.append(js_filepath)
+
+def select_strategy(slot, mutate_only, mutate_js_files):
+    # False once there is nothing left to mutate.
+    if mutate_only:
+        slot['strategy'] = 'mutate'
+        if slot['no_coverage_increase_count'] >= 2 or slot['previous_code'] is None:
+            js_filepath = choose_mutation_file(mutate_js_files)
+            if js_filepath is None:
+                print("No corpus entries or generated JS files left for mutation. Exiting.")
+                return False
+            slot['current_mutation_file'] = js_filepath
+            with open(slot['current_mutation_file'], 'r') as f:
+                slot['previous_code'] = f.read()
+            print(f"Selected new JS file for mutation: {slot['current_mutation_file']}")
+            slot['no_coverage_increase_count'] = 0
+    else:
+        if slot['strategy'] == 'generate' and slot['previous_code'] is not None:
+            slot['strategy'] = 'mutate'
+            print("Switching strategy to 'mutate'")
+        elif slot['strategy'] == 'mutate' and slot['no_coverage_increase_count'] >= 2:
+            slot['strategy'] = 'generate'
+            print("Switching strategy to 'generate'")
+            slot['no_coverage_increase_count'] = 0
+        elif slot['strategy'] == 'mutate':
+            pass
+        else:
+            slot['strategy'] = 'generate'
+    if slot['strategy'] != 'generate':
+        slot['target'] = None
+    return True
+
+def note_target(slot, target, observed):
+    # The target extract_code_snippet() chose for this slot; the outcomes of
+    # the programs generated for it go to the scheduler in apply_feedback().
+    slot['target'] = target
+    if extract_functions.target_scheduler is not None:
+        extract_functions.target_scheduler.assign(target, observed)
+
+def schedule_outcome(slot, record_data):
+    target_scheduler = extract_functions.target_scheduler
+    if target_scheduler is None or slot['target'] is None:
+        return
+    if record_data is None:
+        target_scheduler.record(slot['target'], 0, 0.0)
+    else:
+        target_scheduler.record(slot['target'], record_data.get('new_edges', 0),
+                                record_data.get('execution_time', 0.0))
+
+def apply_feedback(slot, record_data, mutate_only):
+    schedule_outcome(slot, record_data)
+    if record_data is None:
+        print("Failed to get output from fuzz.py for coverage run.")
+        slot['feedback'] = None
+        slot['no_coverage_increase_count'] += 1
+        return
+
+    print(f"Feedback from fuzz.py: {record_data}")
+    feedback = {**record_data}
+    feedback['average_execution_time'] = (
+        fuzz.metrics['total_execution_time'] / fuzz.metrics['total_executions']
+        if fuzz.metrics['total_executions'] > 0 else 0
+    )
+    feedback['total_crashes'] = fuzz.metrics['total_crashes']
+    feedback['total_timeouts'] = fuzz.metrics['total_timeouts']
+    feedback['unique_bugs'] = fuzz.unique_bugs()
+    # The feedback is kept in every slot of state.json; the prompts never
+    # use more of the output than its start.
+    for key in ('stdout', 'stderr'):
+        if isinstance(feedback.get(key), str):
+            feedback[key] = feedback[key][:FEEDBACK_OUTPUT_LIMIT]
+
+    if record_data.get('new_edges', 0) == 0:
+        slot['no_coverage_increase_count'] += 1
+    else:
+        slot['no_coverage_increase_count'] = 0
+
+    stderr = record_data.get('stderr', '')
+    if 'ReferenceError' in stderr:
+        print("ReferenceError detected in stderr.")
+        if not mutate_only:
+            slot['strategy'] = 'generate'
+            slot['no_coverage_increase_count'] = 0
+        feedback['stderr'] = stderr[:FEEDBACK_OUTPUT_LIMIT]
+    slot['feedback'] = feedback
+
+def record_outcome(javascript_code, iteration, record_data):
+    if campaign.program_cache is None:
+        return
+    if record_data is None:
+        campaign.program_cache.record(javascript_code, iteration, 0, 'invalid')
+    else:
+        campaign.program_cache.record(javascript_code, iteration, record_data.get('new_edges', 0),
+                                      record_data.get('bug_type'))
+
+def configure_scheduler(policy, output_folder, state):
+    extract_functions.target_scheduler = scheduler.TargetScheduler(policy, state=state)
+    extract_functions.target_scheduler.open_log(os.path.join(output_folder, scheduler.SCHEDULER_LOG_FILENAME))
+
+def report_scheduler():
+    target_scheduler = extract_functions.target_scheduler
+    if target_scheduler is not None:
+        print(f"Target scheduler: {len(target_scheduler.stats)} functions seen in "
+              f"{target_scheduler.traces} traces, {target_scheduler.cooling()} cooling down.")
+
+def save_state(state_file, iteration, slot, used_files_set, mutate_js_files, slots=None):
+    # Called after every iteration; the checkpoint decides when to write.
+    state = {
+        'iteration': iteration,
+        **{key: slot[key] for key in SLOT_KEYS},
+        'dump_cursor': extract_functions.dump_cursor,
+    }
+    target_scheduler = extract_functions.target_scheduler
+    if target_scheduler is not None:
+        # The statistics go to the journal with the checkpoint.
+        state['scheduler'] = {'clock': target_scheduler.clock, 'traces': target_scheduler.traces}
+    if slots is not None:
+        state['slots'] = slots
+    if campaign.state_checkpoint is not None:
+        campaign.state_checkpoint.save(state, used_files_set, mutate_js_files, target_scheduler)
+        return
+    if target_scheduler is not None:
+        state['scheduler'] = target_scheduler.state()
+    state['used_files_set'] = list(used_files_set)
+    state['mutate_js_files'] = mutate_js_files
+    checkpoint.write_atomic(state_file, state)
 
 def main():
     parser = argparse.ArgumentParser(description='JavaScriptCore Fuzzer')
     parser.add_argument('--version', type=str, default='gpt-4', help='GPT model version to use')
 
     parser.add_argument('--pillm-path', type=str, required=True,
-                        help='Path to the statically-instrumented JSC that generates pillm_dump.txt')
+                        help='Path to the statically-instrumented JSC that generates pillm_trace.bin')
     parser.add_argument('--coverage-path', type=str, required=True,
                         help='Path to the IR-based instrumented JSC (Fuzzilli) for coverage')
 
@@ -125,196 +417,272 @@ def main():
     parser.add_argument('--resume', action='store_true', help='Resume from the last state')
     parser.add_argument('--source', type=str, help='Path to the JSC source code directory')
     parser.add_argument('--mutate', action='store_true', help='Use only mutate strategy')
+    parser.add_argument('--reprl', action='store_true',
+                        help='Keep one persistent coverage JSC and drive it over the Fuzzilli REPRL protocol')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of parallel executor workers sharing one global coverage map')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Overlap LLM generation with execution using an asyncio producer/consumer pipeline')
+    parser.add_argument('--prefetch', type=int, default=None,
+                        help='Number of generated programs queued ahead of execution in --pipeline mode '
+                             '(default: 2 * jobs)')
+    parser.add_argument('--batch', type=int, default=1,
+                        help='Completions requested per prompt; every valid, distinct one is executed')
+    parser.add_argument('--validation', type=str, default='exec', choices=['exec', 'syntax', 'coverage'],
+                        help="How generated programs are validated: 'exec' runs them once before testing, "
+                             "'syntax' only parses them with checkSyntax(), 'coverage' uses the coverage run "
+                             "itself and discards programs it rejects")
+    parser.add_argument('--pillm-sites', type=str, default=None,
+                        help='PILLMSites.tbl of the PILLM build; records site hits in shared memory during each run')
+    parser.add_argument('--scheduler', type=str, default=None, choices=scheduler.POLICIES,
+                        help="Choose the target among all new calls of the PILLM trace from per-function statistics "
+                             "('ucb' or 'weighted') instead of taking the newest call")
+    parser.add_argument('--dedup', action='store_true',
+                        help='Skip programs whose normalized source was already seen in this campaign')
+    parser.add_argument('--response-cache', type=str, default=None,
+                        help='SQLite file caching LLM responses by prompt hash')
+    parser.add_argument('--response-cache-mb', type=int, default=256,
+                        help='Size bound of the response cache in MiB (least recently used entries go first)')
+    parser.add_argument('--replay', action='store_true',
+                        help='Answer prompts from --response-cache only, without API calls')
+    parser.add_argument('--api-base', type=str, default=None,
+                        help='OpenAI-compatible API base URL, e.g. a local mock_llm.py server')
+    parser.add_argument('--checkpoint-interval', type=float, default=checkpoint.CHECKPOINT_INTERVAL,
+                        help='Seconds between writes of state.json (0 writes it after every iteration)')
+    parser.add_argument('--report-interval', type=int, default=reporting.REPORT_INTERVAL,
+                        help='Seconds between coverage heatmap and plot renders in the background (0 disables them)')
     args = parser.parse_args()
 
     openai.api_key = os.getenv("OPENAI_API_KEY")
     if openai.api_key is None:
         print("Error: OPENAI_API_KEY environment variable not set.")
         return
+    if args.api_base:
+        openai.api_base = args.api_base
 
     output_folder = args.log
     os.makedirs(output_folder, exist_ok=True)
     print(f"Using output folder: {output_folder}")
 
     iteration = 0
-    feedback = None
-    state_file = os.path.join(output_folder, 'state.json')
-    no_coverage_increase_count = 0
-    strategy = 'generate' if not args.mutate else 'mutate'
-    previous_code = None
-    used_files_set = set()
+    state_file = os.path.join(output_folder, checkpoint.STATE_FILENAME)
+    slot = new_slot(args.mutate)
+    slots = None
+    used_files_set = checkpoint.JournaledSet()
     mutate_js_files = []
-    current_mutation_file = None
-
-    if args.resume and os.path.exists(state_file):
-        with open(state_file, 'r') as f:
-            state = json.load(f)
-            iteration = state.get('iteration', 0)
-            feedback = state.get('feedback', None)
-            no_coverage_increase_count = state.get('no_coverage_increase_count', 0)
-            strategy = state.get('strategy', strategy)
-            previous_code = state.get('previous_code', None)
-            used_files_set = set(state.get('used_files_set', []))
-            mutate_js_files = state.get('mutate_js_files', [])
-            current_mutation_file = state.get('current_mutation_file', None)
+    scheduler_state = None
+
+    state = campaign.configure_checkpoint(state_file, args.checkpoint_interval, args.resume)
+    if state is not None:
+        iteration = state.get('iteration', 0)
+        for key in SLOT_KEYS:
+            slot[key] = state.get(key, slot[key])
+        slots = state.get('slots', None)
+        used_files_set = checkpoint.JournaledSet(state['used_files_set'])
+        mutate_js_files = state['mutate_js_files']
+        extract_functions.dump_cursor = state.get('dump_cursor', None)
+        scheduler_state = state.get('scheduler', None)
         print("Resuming from the last state.")
     else:
         print("Starting a new session.")
         if os.path.exists(os.path.join(output_folder, 'coverage_bitmap.dat')):
             os.remove(os.path.join(output_folder, 'coverage_bitmap.dat'))
             print("Removed existing coverage bitmap to start fresh.")
+        if os.path.exists(os.path.join(output_folder, coverage_store.EDGE_LOG_FILENAME)):
+            os.remove(os.path.join(output_folder, coverage_store.EDGE_LOG_FILENAME))
         if os.path.exists(os.path.join(output_folder, 'coverage_log.csv')):
             os.remove(os.path.join(output_folder, 'coverage_log.csv'))
             print("Removed existing coverage log to start fresh.")
-        if os.path.exists(os.path.join(output_folder, 'coverage_heatmap.png')):
-            os.remove(os.path.join(output_folder, 'coverage_heatmap.png'))
+        if os.path.exists(os.path.join(output_folder, reporting.COVERAGE_HEATMAP_FILENAME)):
+            os.remove(os.path.join(output_folder, reporting.COVERAGE_HEATMAP_FILENAME))
             print("Removed existing coverage heatmap to start fresh.")
+        for report_filename in (reporting.BINNED_HEATMAP_FILENAME, reporting.COVERAGE_PLOT_FILENAME):
+            if os.path.exists(os.path.join(output_folder, report_filename)):
+                os.remove(os.path.join(output_folder, report_filename))
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(os.path.join(output_folder, PROGRAM_CACHE_FILENAME + suffix)):
+                os.remove(os.path.join(output_folder, PROGRAM_CACHE_FILENAME + suffix))
+        if os.path.exists(os.path.join(output_folder, scheduler.SCHEDULER_LOG_FILENAME)):
+            os.remove(os.path.join(output_folder, scheduler.SCHEDULER_LOG_FILENAME))
 
     fuzz.load_coverage_bitmap(output_folder)
+    fuzz.result_store = results_store.ResultStore(output_folder)
 
-    if args.mutate:
+    if args.replay and not args.response_cache:
+        print("Error: --replay needs --response-cache.")
+        return
+    campaign.configure_caches(output_folder, args.dedup, args.response_cache, args.response_cache_mb, args.replay)
+    if args.scheduler:
+        configure_scheduler(args.scheduler, output_folder, scheduler_state)
+
+    campaign.configure_corpus(output_folder)
+    fuzz.crash_triage = triage.CrashTriage(os.path.join(output_folder, triage.TRIAGE_DIRNAME))
+
+    if args.mutate and campaign.mutation_corpus.entries:
+        mutate_js_files = []
+    elif args.mutate:
         mutate_js_files = glob.glob(os.path.join(output_folder, 'generated_*.js'))
         if not mutate_js_files:
             print("No previously generated JS files found for mutation.")
             return
         print(f"Found {len(mutate_js_files)} JS files for mutation.")
 
+    shm_regions.install_signal_handlers()
+    removed = shm_regions.cleanup_stale_regions()
+    removed += shm_regions.cleanup_stale_regions(site_counters.SITES_SHM_PREFIX)
+    if removed:
+        print(f"Removed {removed} stale coverage regions left by earlier runs.")
+    if args.pillm_sites:
+        site_count = fuzz.configure_pillm_counters(args.pillm_sites)
+        print(f"Live PILLM hit counters for {site_count} sites.")
+
+    if args.report_interval > 0:
+        reporting.Reporter(output_folder, args.report_interval)
+
     start_time = time.time()
     run_duration = args.time * 60 if args.time else None
 
-    while True:
-        if run_duration and (time.time() - start_time) >= run_duration:
-            print(f"Run duration of {args.time} minutes reached. Stopping.")
-            break
+    if args.pipeline:
+        import pipeline
+        if args.prefetch is None:
+            args.prefetch = 2 * args.jobs
+        pipeline.run_pipeline(args, output_folder, state_file, iteration, slot, slots,
+                              used_files_set, mutate_js_files, start_time, run_duration)
+        print("Fuzzing session completed.")
+        return
 
-        print(f"\n--- Iteration {iteration} ---")
+    if args.jobs > 1:
+        import parallel
+        parallel.run_parallel(args, output_folder, state_file, iteration, slot, slots,
+                              used_files_set, mutate_js_files, start_time, run_duration)
+        print("Fuzzing session completed.")
+        return
 
-        if args.mutate:
-            strategy = 'mutate'
-            if no_coverage_increase_count >= 2 or previous_code is None:
-                current_mutation_file = random.choice(mutate_js_files)
-                with open(current_mutation_file, 'r') as f:
-                    previous_code = f.read()
-                print(f"Selected new JS file for mutation: {current_mutation_file}")
-                no_coverage_increase_count = 0
-        else:
-            if strategy == 'generate' and previous_code is not None:
-                strategy = 'mutate'
-                print("Switching strategy to 'mutate'")
-            elif strategy == 'mutate' and no_coverage_increase_count >= 2:
-                strategy = 'generate'
-                print("Switching strategy to 'generate'")
-                no_coverage_increase_count = 0
-            elif strategy == 'mutate':
-                pass
-            else:
-                strategy = 'generate'
+    executor = None
+    if args.reprl:
+        executor = REPRLExecutor(args.coverage_path, shm_regions.allocate_region(fuzz.SHM_SIZE))
+        print(f"Using persistent REPRL executor for {args.coverage_path}")
+
+    pending_candidates = []
+    try:
+        while True:
+            if run_duration and (time.time() - start_time) >= run_duration:
+                print(f"Run duration of {args.time} minutes reached. Stopping.")
+                break
 
-        extracted_function = None
+            print(f"\n--- Iteration {iteration} ---")
 
-        if strategy == 'generate':
-            if not args.source:
-                print("Error: --source argument is required for generate strategy.")
-                return
-            snippet, snippet_file = extract_functions.extract_code_snippet(
-                args.source, used_files_set
+            if pending_candidates:
+                # Remaining valid programs from the last batched request.
+                javascript_code = pending_candidates.pop(0)
+            else:
+                if not select_strategy(slot, args.mutate, mutate_js_files):
+                    break
+
+                extracted_function = None
+
+                if slot['strategy'] == 'generate':
+                    if not args.source:
+                        print("Error: --source argument is required for generate strategy.")
+                        return
+                    snippet, snippet_file = extract_functions.extract_code_snippet(
+                        args.source, used_files_set
+                    )
+                    if snippet is None:
+                        print("No suitable functions found in the source code. Exiting.")
+                        break
+                    note_target(slot, extract_functions.last_target, extract_functions.last_observed)
+                    print(f"Extracted function from {snippet_file}")
+                    extracted_function = snippet
+
+                candidates = generate_javascript_candidates(
+                    feedback=slot['feedback'],
+                    model=args.version,
+                    jsc_path=args.coverage_path,
+                    strategy=slot['strategy'],
+                    previous_code=slot['previous_code'],
+                    extracted_function=extracted_function,
+                    executor=executor,
+                    batch_size=args.batch,
+                    validation=args.validation
+                )
+
+                if not candidates:
+                    print("Skipping iteration due to invalid code.")
+                    slot['no_coverage_increase_count'] += 1
+                    iteration += 1
+                    continue
+                javascript_code, pending_candidates = candidates[0], candidates[1:]
+
+            record_data = None
+            if args.validation == 'coverage':
+                print(f"Running with Coverage JSC: {args.coverage_path}")
+                record_data = fuzz.run_test(
+                    javascript_code,
+                    output_folder,
+                    jsc_path=args.coverage_path,
+                    iteration=iteration,
+                    pillm_run=False,
+                    executor=executor,
+                    discard_invalid=True
+                )
+                if record_data is None:
+                    print("Coverage run reported syntax errors or ReferenceErrors. Discarding the program.")
+                    record_outcome(javascript_code, iteration, None)
+                    slot['no_coverage_increase_count'] += 1
+                    iteration += 1
+                    continue
+
+            print("Generated JavaScript Code:")
+            print(javascript_code)
+
+            timestamp = time.strftime('%Y%m%d_%H%M%S')
+            js_filename = f'generated_{timestamp}.js' if args.batch == 1 else f'generated_{timestamp}_{iteration}.js'
+            js_filepath = os.path.join(output_folder, js_filename)
+            with open(js_filepath, 'w') as js_file:
+                js_file.write(javascript_code)
+            print(f"Saved generated code to {js_filepath}")
+
+            if args.mutate:
+                track_mutation_file(mutate_js_files, js_filepath)
+
+            print(f"Running with PILLM JSC: {args.pillm_path}")
+            fuzz.run_test(
+                javascript_code,
+                output_folder,
+                jsc_path=args.pillm_path,
+                iteration=iteration,
+                pillm_run=True
             )
-            if snippet is None:
-                print("No suitable functions found in the source code. Exiting.")
-                break
-            print(f"Extracted function from {snippet_file}")
-            extracted_function = snippet
-
-        javascript_code = generate_javascript_code(
-            feedback=feedback,
-            model=args.version,
-            jsc_path=args.coverage_path,
-            strategy=strategy,
-            previous_code=previous_code,
-            extracted_function=extracted_function
-        )
 
-        if javascript_code is None:
-            print("Skipping iteration due to invalid code.")
-            no_coverage_increase_count += 1
-            iteration += 1
-            continue
+            if record_data is None:
+                print(f"Running with Coverage JSC: {args.coverage_path}")
+                record_data = fuzz.run_test(
+                    javascript_code,
+                    output_folder,
+                    jsc_path=args.coverage_path,
+                    iteration=iteration,
+                    pillm_run=False,
+                    executor=executor
+                )
 
-        print("Generated JavaScript Code:")
-        print(javascript_code)
-
-        timestamp = time.strftime('%Y%m%d_%H%M%S')
-        js_filename = f'generated_{timestamp}.js'
-        js_filepath = os.path.join(output_folder, js_filename)
-        with open(js_filepath, 'w') as js_file:
-            js_file.write(javascript_code)
-        print(f"Saved generated code to {js_filepath}")
-
-        if args.mutate:
-            mutate_js_files.append(js_filepath)
-
-        print(f"Running with PILLM JSC: {args.pillm_path}")
-        fuzz.run_test(
-            javascript_code,
-            output_folder,
-            jsc_path=args.pillm_path,
-            iteration=iteration,
-            pillm_run=True
-        )
+            add_to_corpus(js_filepath, javascript_code, record_data)
+            record_outcome(javascript_code, iteration, record_data)
+            apply_feedback(slot, record_data, args.mutate)
+            slot['previous_code'] = javascript_code
 
-        print(f"Running with Coverage JSC: {args.coverage_path}")
-        record_data = fuzz.run_test(
-            javascript_code,
-            output_folder,
-            jsc_path=args.coverage_path,
-            iteration=iteration,
-            pillm_run=False
-        )
+            save_state(state_file, iteration + 1, slot, used_files_set, mutate_js_files)
 
-        if record_data is None:
-            print("Failed to get output from fuzz.py for coverage run.")
-            feedback = None
-            no_coverage_increase_count += 1
-        else:
-            print(f"Feedback from fuzz.py: {record_data}")
-            feedback = {**record_data}
-            feedback['average_execution_time'] = (
-                fuzz.metrics['total_execution_time'] / fuzz.metrics['total_executions']
-                if fuzz.metrics['total_executions'] > 0 else 0
-            )
-            feedback['total_crashes'] = fuzz.metrics['total_crashes']
-            feedback['total_timeouts'] = fuzz.metrics['total_timeouts']
-            feedback['unique_bugs'] = len(fuzz.metrics['unique_bug_types'])
+            iteration += 1
 
-            if record_data.get('new_edges', 0) == 0:
-                no_coverage_increase_count += 1
-            else:
-                no_coverage_increase_count = 0
-
-            stderr = record_data.get('stderr', '')
-            if 'ReferenceError' in stderr:
-                print("ReferenceError detected in stderr.")
-                if not args.mutate:
-                    strategy = 'generate'
-                    no_coverage_increase_count = 0
-                feedback['stderr'] = stderr
-
-        previous_code = javascript_code
-
-        state = {
-            'iteration': iteration + 1,
-            'feedback': feedback,
-            'no_coverage_increase_count': no_coverage_increase_count,
-            'strategy': strategy,
-            'previous_code': previous_code,
-            'used_files_set': list(used_files_set),
-            'mutate_js_files': mutate_js_files,
-            'current_mutation_file': current_mutation_file,
-        }
-        with open(state_file, 'w') as f:
-            json.dump(state, f)
-
-        iteration += 1
+    finally:
+        fuzz.report_validation_paths()
+        fuzz.report_bugs()
+        report_caches()
+        report_scheduler()
+        if executor is not None:
+            print(f"REPRL executor ran {executor.executions} scripts with {executor.spawns} process starts")
+            executor.close()
 
     print("Fuzzing session completed.")
 
@@ -0,0 +1,142 @@
+import os
+import re
+import glob
+import time
+import hashlib
+import itertools
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import fuzz
+import triage
+import results_store
+
+MINIMIZED_DIRNAME = 'minimized'
+
+# Units of the token level: a string, template, identifier or number, or a
+# single punctuation character, each with the whitespace that follows it.
+TOKEN_PATTERN = re.compile(r'(?:"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`|\w+|[^\w\s])\s*'
+                           r'|\s+', re.DOTALL)
+
+def split_lines(javascript_code):
+    return javascript_code.splitlines(keepends=True)
+
+def split_tokens(javascript_code):
+    return TOKEN_PATTERN.findall(javascript_code)
+
+# Reruns reductions of a crashing program on a pool of threads, each driving
+# its own JSC process, and accepts a reduction only if it crashes with the
+# same bug_type and into the same triage bucket as the original.
+class Reproducer:
+
+    def __init__(self, jsc_path, pool, timeout):
+        self.jsc_path = jsc_path
+        self.pool = pool
+        self.timeout = timeout
+        self.expected = None
+        self.results = {}
+        self.executions = 0
+
+    def run(self, javascript_code):
+        env = os.environ.copy()
+        env.pop('SHM_ID', None)
+        jsc_status, stdout_decoded, stderr_decoded, execution_time = fuzz.spawn_test(
+            javascript_code, self.jsc_path, env, self.timeout)
+        self.executions += 1
+        bug_type = fuzz.classify_bug(jsc_status, stderr_decoded)
+        return bug_type, triage.bucket_id(triage.crash_signature(jsc_status, stderr_decoded, bug_type))
+
+    def reproduce(self, javascript_code):
+        key = hashlib.sha256(javascript_code.encode()).digest()
+        if key not in self.results:
+            self.results[key] = self.run(javascript_code) == self.expected
+        return self.results[key]
+
+    def first_reproducing(self, candidates):
+        # Index of the first candidate that reproduces, running them in
+        # parallel; later candidates still queued are cancelled once the
+        # answer is known.
+        futures = [self.pool.submit(self.reproduce, ''.join(units)) for units in candidates]
+        try:
+            for index, future in enumerate(futures):
+                if future.result():
+                    return index
+        finally:
+            for future in futures:
+                future.cancel()
+        return None
+
+    def ddmin(self, units):
+        n = 2
+        while len(units) >= 2:
+            size = len(units) / n
+            chunks = [units[round(i * size):round((i + 1) * size)] for i in range(n)]
+            complements = [units[:round(i * size)] + units[round((i + 1) * size):] for i in range(n)] if n > 2 else []
+            index = self.first_reproducing(chunks + complements)
+            if index is not None and index < n:
+                units, n = chunks[index], 2
+            elif index is not None:
+                units, n = complements[index - n], max(n - 1, 2)
+            elif n >= len(units):
+                break
+            else:
+                n = min(2 * n, len(units))
+        return units
+
+    def minimize(self, javascript_code):
+        # Line-level ddmin, then token-level ddmin on what is left. Returns
+        # None if the program does not crash the same way on its own.
+        self.expected = self.run(javascript_code)
+        if not fuzz.is_crash(self.expected[0]):
+            return None
+        reduced = ''.join(self.ddmin(split_lines(javascript_code)))
+        return ''.join(self.ddmin(split_tokens(reduced)))
+
+def legacy_crash_records(output_folder):
+    for record_filepath in sorted(glob.glob(os.path.join(output_folder, 'record_*.txt'))):
+        if triage.CRASH_RECORD_PATTERN.search(record_filepath):
+            yield record_filepath, fuzz.read_record(record_filepath)
+
+def crash_records(output_folder):
+    # One record per crashing program; the PILLM and coverage runs of a
+    # program write one each.
+    records = {}
+    for record_filepath, record in itertools.chain(results_store.crash_records(output_folder),
+                                                   legacy_crash_records(output_folder)):
+        if not fuzz.is_crash(record.get('bug_type')) or 'test_code' not in record:
+            continue
+        program_hash = hashlib.sha256(record['test_code'].encode()).hexdigest()[:8]
+        records.setdefault(program_hash, (record_filepath, record))
+    return records
+
+def minimize_outputs(output_folder, jsc_path, jobs, timeout):
+    minimized_folder = os.path.join(output_folder, MINIMIZED_DIRNAME)
+    os.makedirs(minimized_folder, exist_ok=True)
+    records = crash_records(output_folder)
+    print(f"{len(records)} crashing programs in {output_folder}.")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for program_hash, (record_filepath, record) in records.items():
+            minimized_filepath = os.path.join(minimized_folder, f"{program_hash}_{record['bug_type']}.js")
+            if os.path.exists(minimized_filepath):
+                continue
+            reproducer = Reproducer(jsc_path, pool, timeout)
+            start_time = time.time()
+            minimized = reproducer.minimize(record['test_code'])
+            if minimized is None:
+                print(f"{os.path.basename(record_filepath)}: does not reproduce ({reproducer.expected[0]}).")
+                continue
+            with open(minimized_filepath, 'w') as f:
+                f.write(minimized)
+            print(f"{os.path.basename(record_filepath)}: {len(record['test_code'])} -> {len(minimized)} bytes, "
+                  f"{reproducer.executions} executions in {time.time() - start_time:.1f}s, "
+                  f"saved to {minimized_filepath}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Minimize the crashing programs of an output folder.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder holding the record files')
+    parser.add_argument('--jsc-path', type=str, required=True, help='JSC build used to reproduce the crashes')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Programs executed in parallel')
+    parser.add_argument('--timeout', type=float, default=fuzz.EXECUTION_TIMEOUT,
+                        help='Seconds before a reduction counts as a timeout')
+    args = parser.parse_args()
+    minimize_outputs(args.log, os.path.abspath(args.jsc_path), args.jobs, args.timeout)
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import glob
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local stand-in for the OpenAI chat completions endpoint, so the fuzzing
+# loop can run offline. Point the fuzzer at it with
+#   generate.py --api-base http://127.0.0.1:8000/v1 ...
+# Every completion is a random program from --corpus (or a small built-in
+# set), returned after --latency seconds to mimic a real model. A share of
+# --invalid-rate completions is broken on purpose to exercise validation.
+
+BUILTIN_PROGRAMS = [
+    "let a = [1, 2, 3];\na.sort((x, y) => y - x);\nlet s = a.join(',');",
+    "function f(o) { return o.x + 1; }\nfor (let i = 0; i < 1000; i++) f({x: i});",
+    "let m = new Map();\nfor (let i = 0; i < 100; i++) m.set(i, String(i));\nm.delete(50);",
+    "let r = /a(b+)c/g;\nlet s = 'abbbc abc'.replace(r, '$1');",
+    "class A { constructor() { this.v = 1; } get w() { return this.v * 2; } }\nlet x = new A().w;",
+    "let buf = new ArrayBuffer(16);\nlet view = new DataView(buf);\nview.setFloat64(0, Math.PI);",
+    "let p = new Proxy({}, { get: (t, k) => k.length });\nlet n = p.hello;",
+    "let o = JSON.parse('{\"a\": [1, {\"b\": null}]}');\nlet t = JSON.stringify(o, null, 2);",
+]
+
+INVALID_PROGRAMS = [
+    "let x = (1 ?! 2);",
+    "let value = undefinedVariable + 1;",
+]
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    programs = BUILTIN_PROGRAMS
+    latency = 0.0
+    invalid_rate = 0.0
+    lock = threading.Lock()
+    requests_served = 0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            request = {}
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404, 'Only /chat/completions is implemented')
+            return
+
+        time.sleep(self.latency)
+        n = int(request.get('n', 1))
+        choices = []
+        for i in range(n):
+            if random.random() < self.invalid_rate:
+                program = random.choice(INVALID_PROGRAMS)
+            else:
+                program = random.choice(self.programs)
+            choices.append({
+                'index': i,
+                'message': {'role': 'assistant', 'content': f"```javascript\n{program}\n```"},
+                'finish_reason': 'stop',
+            })
+        response = {
+            'id': f'chatcmpl-mock-{random.getrandbits(32):08x}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': choices,
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.lock:
+            MockLLMHandler.requests_served += 1
+
+    def log_message(self, format, *args):
+        pass
+
+def load_programs(corpus_dir):
+    programs = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '*.js'))):
+        with open(path, 'r', errors='replace') as f:
+            programs.append(f.read())
+    return programs
+
+def serve(host='127.0.0.1', port=8000, latency=0.0, programs=None, invalid_rate=0.0):
+    MockLLMHandler.latency = latency
+    MockLLMHandler.invalid_rate = invalid_rate
+    if programs:
+        MockLLMHandler.programs = programs
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI chat completions endpoint for offline fuzzing.')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds to wait before each response')
+    parser.add_argument('--invalid-rate', type=float, default=0.1,
+                        help='Fraction of completions that are deliberately invalid programs')
+    parser.add_argument('--corpus', type=str, default=None, help='Directory of .js files to answer with')
+    args = parser.parse_args()
+
+    programs = load_programs(args.corpus) if args.corpus else None
+    server = serve(args.host, args.port, args.latency, programs, args.invalid_rate)
+    print(f"Mock LLM listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
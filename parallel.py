@@ -0,0 +1,322 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import openai
+import fuzz
+import generate
+import campaign
+import shm_regions
+import extract_functions
+import scheduler
+from coverage_map import sparse_coverage
+from reprl import REPRLExecutor
+
+# Per-process state of a worker, set up once by init_worker().
+_worker = {}
+# Coordinator side: the scheduler version each worker process has caught up
+# to, by pid, so that tasks only carry the statistics changed since.
+_scheduler_versions = {}
+
+def init_worker(config):
+    # Each worker runs in its own directory so that the pillm_trace.bin written
+    # by the PILLM JSC does not clash between workers. Each worker keeps its own
+    # extract_functions.dump_cursor, which ends with the directory.
+    workdir = tempfile.mkdtemp(prefix='pillm_worker_')
+    os.chdir(workdir)
+    openai.api_key = config['api_key']
+    if config['api_base']:
+        openai.api_base = config['api_base']
+    campaign.configure_caches(config['output_folder'], config['dedup'], config['response_cache'],
+                              config['response_cache_mb'], config['replay'])
+    if config['pillm_sites']:
+        fuzz.configure_pillm_counters(config['pillm_sites'])
+    if config['scheduler']:
+        extract_functions.target_scheduler = scheduler.TargetScheduler(config['scheduler'])
+    region = shm_regions.allocate_region(fuzz.SHM_SIZE)
+    executor = REPRLExecutor(config['coverage_path'], region) if config['reprl'] else None
+    _worker.update(config=config, workdir=workdir, region=region, executor=executor)
+    multiprocessing.util.Finalize(None, shutdown_worker, exitpriority=10)
+
+def shutdown_worker():
+    if _worker.get('executor') is not None:
+        _worker['executor'].close()
+    else:
+        _worker['region'].release()
+    if fuzz.pillm_counters is not None:
+        fuzz.pillm_counters.release()
+    shutil.rmtree(_worker['workdir'], ignore_errors=True)
+
+def run_iteration(task):
+    config = _worker['config']
+    executor = _worker['executor']
+
+    result = {
+        'runs': [],
+        'snippet_file': None,
+        'target': None,
+        'observed': {},
+        'no_target': False,
+        'worker': os.getpid(),
+        'scheduler_version': None,
+    }
+
+    extracted_function = None
+    if task['strategy'] == 'generate':
+        if task['scheduler'] is not None:
+            # The coordinator's statistics; this copy only chooses.
+            extract_functions.target_scheduler.merge(task['scheduler'])
+            result['scheduler_version'] = extract_functions.target_scheduler.version
+        snippet, snippet_file = extract_functions.extract_trace_snippet(config['source'])
+        if snippet is None:
+            # The random function the coordinator picked from its unused files.
+            snippet, snippet_file = task['fallback']
+        if snippet is None:
+            result['no_target'] = True
+            return result
+        result['snippet_file'] = snippet_file
+        result['target'] = extract_functions.last_target
+        result['observed'] = extract_functions.last_observed
+        extracted_function = snippet
+
+    candidates = generate.generate_javascript_candidates(
+        feedback=task['feedback'],
+        model=config['model'],
+        jsc_path=config['coverage_path'],
+        strategy=task['strategy'],
+        previous_code=task['previous_code'],
+        extracted_function=extracted_function,
+        executor=executor,
+        batch_size=config['batch'],
+        validation=config['validation']
+    )
+    for javascript_code in candidates:
+        result['runs'].append(execute_candidate(javascript_code))
+    result['validation_paths'] = take_validation_paths()
+    return result
+
+def take_validation_paths():
+    # Validation happens in the workers; their counts are folded into the
+    # coordinator's fuzz.metrics with every result.
+    with fuzz.validation_lock:
+        paths = dict(fuzz.metrics['validation_paths'])
+        fuzz.metrics['validation_paths'].clear()
+    return paths
+
+def execute_candidate(javascript_code):
+    # PILLM run and coverage run, both in this worker's directory.
+    config = _worker['config']
+    result = {'javascript_code': javascript_code, 'pillm_dump': {}}
+
+    if config['validation'] == 'coverage':
+        # The coverage run doubles as validation: run it first and skip the
+        # PILLM run for programs it rejects.
+        run_coverage(result)
+        if fuzz.is_invalid_output(result['coverage'][2]):
+            return result
+
+    result['pillm'], result['site_hits'] = fuzz.spawn_pillm(javascript_code, config['pillm_path'])
+    result['pillm_dump'] = extract_functions.read_dump_files()
+
+    if 'coverage' not in result:
+        run_coverage(result)
+    return result
+
+def run_coverage(result):
+    config = _worker['config']
+    region = _worker['region']
+    executor = _worker['executor']
+    javascript_code = result['javascript_code']
+
+    if executor is not None:
+        result['coverage'] = executor.execute(javascript_code)
+        result['startup_output'] = executor.startup_output
+    else:
+        region.reset()
+        env = os.environ.copy()
+        env['SHM_ID'] = region.name
+        result['coverage'] = fuzz.spawn_test(javascript_code, config['coverage_path'], env)
+        result['startup_output'] = ''
+    result['coverage_data'] = sparse_coverage(region.mapfile)
+
+def submit_iteration(pool, slot, args, used_files_set, mutate_js_files):
+    # None once there is nothing left to mutate.
+    if not generate.select_strategy(slot, args.mutate, mutate_js_files):
+        return None
+    task = {
+        'strategy': slot['strategy'],
+        'feedback': slot['feedback'],
+        'previous_code': slot['previous_code'],
+        'fallback': (None, None),
+        'scheduler': None,
+    }
+    if slot['strategy'] == 'generate':
+        # The file is marked used in handle_result(), once the worker took it.
+        task['fallback'] = extract_functions.pick_random_function(os.path.abspath(args.source), used_files_set)
+        if extract_functions.target_scheduler is not None:
+            task['scheduler'] = scheduler_changes(args.jobs)
+    return pool.submit(run_iteration, task)
+
+def scheduler_changes(jobs):
+    # Every worker has what the one furthest behind has; until each of them
+    # has reported once, a task carries the whole state.
+    since = None
+    if len(_scheduler_versions) >= jobs:
+        since = min(_scheduler_versions.values())
+    return extract_functions.target_scheduler.changes(since)
+
+def handle_result(result, slot, iteration, args, output_folder, used_files_set, mutate_js_files):
+    with fuzz.validation_lock:
+        fuzz.metrics['validation_paths'].update(result['validation_paths'])
+    if result['scheduler_version'] is not None:
+        worker = result['worker']
+        _scheduler_versions[worker] = max(_scheduler_versions.get(worker, 0), result['scheduler_version'])
+    if result['snippet_file']:
+        generate.note_target(slot, result['target'], result['observed'])
+        used_files_set.add(result['snippet_file'])
+        print(f"Extracted function from {result['snippet_file']}")
+
+    if not result['runs']:
+        print(f"\n--- Iteration {iteration} ---")
+        print("Skipping iteration due to invalid code.")
+        slot['no_coverage_increase_count'] += 1
+        return iteration + 1
+
+    for run in result['runs']:
+        record_run(run, slot, iteration, args, output_folder, mutate_js_files)
+        iteration += 1
+    return iteration
+
+def record_run(run, slot, iteration, args, output_folder, mutate_js_files):
+    print(f"\n--- Iteration {iteration} ---")
+    javascript_code = run['javascript_code']
+
+    if args.validation == 'coverage':
+        if not fuzz.count_coverage_validation(run['coverage'][2], run['coverage'][3]):
+            print("Coverage run reported syntax errors or ReferenceErrors. Discarding the program.")
+            generate.record_outcome(javascript_code, iteration, None)
+            slot['no_coverage_increase_count'] += 1
+            return
+    print("Generated JavaScript Code:")
+    print(javascript_code)
+
+    # Workers finish in the same second, so the iteration keeps names unique.
+    timestamp = time.strftime('%Y%m%d_%H%M%S')
+    js_filepath = os.path.join(output_folder, f'generated_{timestamp}_{iteration}.js')
+    with open(js_filepath, 'w') as js_file:
+        js_file.write(javascript_code)
+    print(f"Saved generated code to {js_filepath}")
+
+    if args.mutate:
+        generate.track_mutation_file(mutate_js_files, js_filepath)
+
+    fuzz.merge_site_hits(run['site_hits'])
+    fuzz.process_result(javascript_code, output_folder, iteration, True, *run['pillm'], None)
+
+    if fuzz.total_possible_edges is None and run['startup_output']:
+        fuzz.total_possible_edges = fuzz.get_total_possible_edges(run['startup_output'])
+    record_data = fuzz.process_result(javascript_code, output_folder, iteration, False,
+                                      *run['coverage'], run['coverage_data'])
+
+    generate.add_to_corpus(js_filepath, javascript_code, record_data)
+    generate.record_outcome(javascript_code, iteration, record_data)
+    generate.apply_feedback(slot, record_data, args.mutate)
+    slot['previous_code'] = javascript_code
+
+def worker_config(args):
+    return {
+        'api_key': openai.api_key,
+        'api_base': args.api_base,
+        'model': args.version,
+        'pillm_path': os.path.abspath(args.pillm_path),
+        'coverage_path': os.path.abspath(args.coverage_path),
+        'source': os.path.abspath(args.source) if args.source else None,
+        'reprl': args.reprl,
+        'batch': args.batch,
+        'validation': args.validation,
+        'output_folder': os.path.abspath(args.log),
+        'dedup': args.dedup,
+        'response_cache': os.path.abspath(args.response_cache) if args.response_cache else None,
+        'response_cache_mb': args.response_cache_mb,
+        'replay': args.replay,
+        'pillm_sites': os.path.abspath(args.pillm_sites) if args.pillm_sites else None,
+        'scheduler': args.scheduler,
+    }
+
+def prepare_slots(args, slot, slots):
+    # One strategy slot per worker; a sequential session resumes in slot 0.
+    if slots is None:
+        slots = [slot]
+    slots = slots[:args.jobs]
+    while len(slots) < args.jobs:
+        slots.append(generate.new_slot(args.mutate))
+    return slots
+
+def run_parallel(args, output_folder, state_file, iteration, slot, slots,
+                 used_files_set, mutate_js_files, start_time, run_duration):
+    if not args.mutate and not args.source:
+        print("Error: --source argument is required for generate strategy.")
+        return
+
+    slots = prepare_slots(args, slot, slots)
+    config = worker_config(args)
+    print(f"Starting {args.jobs} parallel workers.")
+
+    stopping = False
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(config,)) as pool:
+            pending = {}
+            for slot_id in range(args.jobs):
+                future = submit_iteration(pool, slots[slot_id], args, used_files_set, mutate_js_files)
+                if future is None:
+                    stopping = True
+                    break
+                pending[future] = slot_id
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    slot_id = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        # An API or REPRL error of one worker; the slot gets a new task.
+                        print(f"Worker of slot {slot_id} failed: {e!r}")
+                        slots[slot_id]['no_coverage_increase_count'] += 1
+                        result = None
+
+                    if result is not None and result['no_target']:
+                        if not stopping:
+                            print("No suitable functions found in the source code. Exiting.")
+                        stopping = True
+                        continue
+
+                    if result is not None:
+                        iteration = handle_result(result, slots[slot_id], iteration, args, output_folder,
+                                                  used_files_set, mutate_js_files)
+                        generate.save_state(state_file, iteration, slots[0], used_files_set, mutate_js_files,
+                                            slots)
+
+                    if run_duration and (time.time() - start_time) >= run_duration and not stopping:
+                        print(f"Run duration of {args.time} minutes reached. Waiting for running workers.")
+                        stopping = True
+                    if not stopping:
+                        future = submit_iteration(pool, slots[slot_id], args, used_files_set, mutate_js_files)
+                        if future is None:
+                            stopping = True
+                        else:
+                            pending[future] = slot_id
+    finally:
+        fuzz.report_validation_paths()
+        fuzz.report_bugs()
+        generate.report_scheduler()
+
+    metrics = fuzz.metrics
+    if metrics['total_executions']:
+        print(f"{metrics['total_executions']} executions across {args.jobs} workers, "
+              f"average {metrics['total_execution_time'] / metrics['total_executions']:.3f}s each.")
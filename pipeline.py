@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import fuzz
+import generate
+import parallel
+import extract_functions
+
+# LLM generation and JSC execution as an asyncio producer/consumer pipeline.
+# One producer per strategy slot keeps requesting programs for its next target
+# and puts them on a bounded queue; the consumers hand queued programs to the
+# executor worker pool. A full queue blocks the producers, so at most
+# `prefetch` programs are generated ahead of execution.
+
+def extract_target(source_dir, used_files_set):
+    # Runs in a thread: extract_code_snippet() and the module globals it sets.
+    snippet, snippet_file = extract_functions.extract_code_snippet(source_dir, used_files_set)
+    return snippet, snippet_file, extract_functions.last_target, extract_functions.last_observed
+
+async def produce(slot_id, slot, queue, context):
+    args = context['args']
+    while not context['stopping']:
+        if not generate.select_strategy(slot, args.mutate, context['mutate_js_files']):
+            context['stopping'] = True
+            break
+
+        extracted_function = None
+        target = None
+        if slot['strategy'] == 'generate':
+            # The trace files, the dump cursor and used_files_set are shared
+            # with the other producers and the consumers.
+            async with context['trace_lock']:
+                snippet, snippet_file, target, observed = await asyncio.to_thread(
+                    extract_target, args.source, context['used_files_set'])
+            if snippet is None:
+                if not context['stopping']:
+                    print("No suitable functions found in the source code. Exiting.")
+                context['stopping'] = True
+                break
+            generate.note_target(slot, target, observed)
+            print(f"Extracted function from {snippet_file}")
+            extracted_function = snippet
+
+        start_time = time.time()
+        candidates = await asyncio.to_thread(
+            generate.generate_javascript_candidates,
+            feedback=slot['feedback'],
+            model=args.version,
+            jsc_path=args.coverage_path,
+            strategy=slot['strategy'],
+            previous_code=slot['previous_code'],
+            extracted_function=extracted_function,
+            batch_size=args.batch,
+            validation=args.validation
+        )
+        context['llm_time'] += time.time() - start_time
+
+        if not candidates:
+            print("Skipping candidate due to invalid code.")
+            slot['no_coverage_increase_count'] += 1
+            continue
+        for javascript_code in candidates:
+            await queue.put({'slot_id': slot_id, 'javascript_code': javascript_code, 'target': target})
+
+async def consume(queue, pool, slots, context):
+    args = context['args']
+    loop = asyncio.get_running_loop()
+    while True:
+        candidate = await queue.get()
+        if candidate is None:
+            break
+        if context['stopping']:
+            continue
+
+        iteration = context['iteration']
+        context['iteration'] += 1
+
+        start_time = time.time()
+        result = await loop.run_in_executor(pool, parallel.execute_candidate, candidate['javascript_code'])
+        context['exec_time'] += time.time() - start_time
+
+        # The producer may have moved on to another target since.
+        slot = slots[candidate['slot_id']]
+        slot['target'] = candidate['target']
+        parallel.record_run(result, slot, iteration, args, context['output_folder'], context['mutate_js_files'])
+        async with context['trace_lock']:
+            # Keep the newest trace where extract_code_snippet looks for it, as
+            # in the sequential loop where the PILLM JSC runs in this directory.
+            extract_functions.write_dump_files(result['pillm_dump'])
+            generate.save_state(context['state_file'], context['iteration'], slots[0],
+                                context['used_files_set'], context['mutate_js_files'], slots)
+        context['completed'] += 1
+
+        if context['run_duration'] and (time.time() - context['start_time']) >= context['run_duration']:
+            if not context['stopping']:
+                print(f"Run duration of {args.time} minutes reached. Stopping.")
+            context['stopping'] = True
+
+async def run_pipeline_async(args, context, slots):
+    queue = asyncio.Queue(maxsize=args.prefetch)
+    context['trace_lock'] = asyncio.Lock()
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=parallel.init_worker,
+                             initargs=(parallel.worker_config(args),)) as pool:
+        consumers = [asyncio.create_task(consume(queue, pool, slots, context)) for _ in range(args.jobs)]
+        producers = [asyncio.create_task(produce(slot_id, slot, queue, context))
+                     for slot_id, slot in enumerate(slots)]
+        producers_done = asyncio.gather(*producers)
+        try:
+            done, _ = await asyncio.wait([producers_done, *consumers], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            context['stopping'] = True
+            producers_done.cancel()
+            await asyncio.gather(producers_done, return_exceptions=True)
+            # Drop whatever is still queued, then stop the remaining consumers.
+            while not queue.empty():
+                queue.get_nowait()
+            for consumer in consumers:
+                if not consumer.done():
+                    await queue.put(None)
+            await asyncio.gather(*consumers, return_exceptions=True)
+
+def run_pipeline(args, output_folder, state_file, iteration, slot, slots,
+                 used_files_set, mutate_js_files, start_time, run_duration):
+    if not args.mutate and not args.source:
+        print("Error: --source argument is required for generate strategy.")
+        return
+
+    slots = parallel.prepare_slots(args, slot, slots)
+    if args.source:
+        args.source = os.path.abspath(args.source)
+    context = {
+        'args': args,
+        'output_folder': output_folder,
+        'state_file': state_file,
+        'iteration': iteration,
+        'used_files_set': used_files_set,
+        'mutate_js_files': mutate_js_files,
+        'start_time': start_time,
+        'run_duration': run_duration,
+        'stopping': False,
+        'completed': 0,
+        'llm_time': 0.0,
+        'exec_time': 0.0,
+    }
+    print(f"Starting pipeline with {len(slots)} producers, {args.jobs} executors "
+          f"and {args.prefetch} prefetched programs.")
+
+    try:
+        asyncio.run(run_pipeline_async(args, context, slots))
+    finally:
+        fuzz.report_validation_paths()
+        fuzz.report_bugs()
+        generate.report_caches()
+        generate.report_scheduler()
+        completed = context['completed']
+        if completed:
+            wall_time = time.time() - start_time
+            print(f"Pipeline ran {completed} programs: {wall_time / completed:.3f}s wall time per program, "
+                  f"{context['llm_time'] / completed:.3f}s LLM and "
+                  f"{context['exec_time'] / completed:.3f}s execution per program.")
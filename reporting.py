@@ -0,0 +1,152 @@
+import os
+import csv
+import math
+import time
+import signal
+import atexit
+import argparse
+import multiprocessing
+import numpy as np
+import fuzz
+from coverage_map import popcount, POPCOUNT_TABLE
+from coverage_store import COVERAGE_BITMAP_FILENAME
+
+COVERAGE_HEATMAP_FILENAME = 'coverage_heatmap.png'
+BINNED_HEATMAP_FILENAME = 'coverage_heatmap_binned.png'
+COVERAGE_PLOT_FILENAME = 'coverage_plot.png'
+REPORT_INTERVAL = 60
+# Side of the binned heatmap; each cell counts the edges of a block of bytes.
+BINNED_SIDE = 128
+JOIN_TIMEOUT = 30
+
+def matrix_side(size):
+    return int(math.isqrt(size))
+
+def binned_coverage(bitmap, side=BINNED_SIDE):
+    # Edges per cell of a side x side grid over the square bitmap layout.
+    full = matrix_side(len(bitmap))
+    block = max(full // side, 1)
+    side = full // block
+    edges = POPCOUNT_TABLE[bitmap[:full * full]].astype(np.uint32).reshape(full, full)
+    return edges[:side * block, :side * block].reshape(side, block, side, block).sum(axis=(1, 3))
+
+def read_coverage_log(output_folder):
+    coverage_log_path = os.path.join(output_folder, fuzz.COVERAGE_LOG_FILENAME)
+    if not os.path.exists(coverage_log_path):
+        return []
+    with open(coverage_log_path, 'r', newline='') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+def render_reports(output_folder, bitmap):
+    # Plotting is only ever imported here, in the reporting process.
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    side = matrix_side(len(bitmap))
+    plt.figure(figsize=(10, 10))
+    plt.imshow(bitmap[:side * side].reshape(side, side), cmap='hot', interpolation='nearest')
+    plt.title('Coverage Heatmap')
+    plt.colorbar()
+    heatmap_path = os.path.join(output_folder, COVERAGE_HEATMAP_FILENAME)
+    plt.savefig(heatmap_path + '.tmp.png')
+    plt.close()
+    os.replace(heatmap_path + '.tmp.png', heatmap_path)
+
+    binned = binned_coverage(bitmap)
+    plt.figure(figsize=(10, 10))
+    plt.imshow(binned, cmap='hot', interpolation='nearest')
+    plt.title(f'Edges per {len(bitmap) // binned.size} map bytes')
+    plt.colorbar()
+    binned_path = os.path.join(output_folder, BINNED_HEATMAP_FILENAME)
+    plt.savefig(binned_path + '.tmp.png')
+    plt.close()
+    os.replace(binned_path + '.tmp.png', binned_path)
+
+    rows = read_coverage_log(output_folder)
+    if rows:
+        iterations = [int(row['iteration']) for row in rows]
+        fig, edges_axis = plt.subplots(figsize=(10, 5))
+        edges_axis.plot(iterations, [int(row['cumulative_edges_covered']) for row in rows], label='edges covered')
+        edges_axis.set_xlabel('iteration')
+        edges_axis.set_ylabel('edges covered')
+        crashes_axis = edges_axis.twinx()
+        crashes_axis.plot(iterations, [int(row['total_crashes']) for row in rows], color='red', label='crashes')
+        crashes_axis.set_ylabel('crashes')
+        plot_path = os.path.join(output_folder, COVERAGE_PLOT_FILENAME)
+        fig.savefig(plot_path + '.tmp.png')
+        plt.close(fig)
+        os.replace(plot_path + '.tmp.png', plot_path)
+    print(f"Saved coverage heatmaps and plot to {output_folder}")
+
+def read_snapshot(output_folder):
+    # The campaign maps the bitmap with MAP_SHARED, so reading the file sees
+    # its updates before they are flushed.
+    bitmap_path = os.path.join(output_folder, COVERAGE_BITMAP_FILENAME)
+    if not os.path.exists(bitmap_path):
+        return None
+    return np.fromfile(bitmap_path, dtype=np.uint8)
+
+def report_loop(output_folder, interval, stop_event):
+    # Renders whenever the covered edges changed, every interval seconds
+    # and once more when the campaign stops.
+    rendered_edges = None
+    while True:
+        stopping = stop_event.wait(interval)
+        bitmap = read_snapshot(output_folder)
+        if bitmap is not None:
+            edges = popcount(bitmap)
+            if edges != rendered_edges:
+                try:
+                    render_reports(output_folder, bitmap)
+                    rendered_edges = edges
+                except Exception as e:
+                    print(f"Coverage report failed: {e}")
+        if stopping:
+            break
+
+def run_reporter(output_folder, interval, stop_event):
+    # Ctrl-C reaches the whole process group; the campaign stops us itself
+    # after its last iteration.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    report_loop(output_folder, interval, stop_event)
+
+# The reporting stage of a campaign: a separate process that renders the
+# heatmaps and the coverage plot from snapshots of coverage_bitmap.dat, so
+# the fuzzing loop never waits on matplotlib.
+class Reporter:
+
+    def __init__(self, output_folder, interval=REPORT_INTERVAL):
+        self.stop_event = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=run_reporter, args=(output_folder, interval, self.stop_event),
+                                               name='pillm-reporter', daemon=True)
+        self.process.start()
+        atexit.register(self.close)
+
+    def close(self):
+        if not self.process.is_alive():
+            return
+        self.stop_event.set()
+        self.process.join(JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the coverage heatmaps and plot of an output folder.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder of the campaign')
+    parser.add_argument('--watch', type=int, default=None, help='Keep rendering every N seconds until interrupted')
+    args = parser.parse_args()
+
+    if args.watch:
+        try:
+            report_loop(args.log, args.watch, multiprocessing.Event())
+        except KeyboardInterrupt:
+            pass
+    else:
+        bitmap = read_snapshot(args.log)
+        if bitmap is None:
+            print(f"No {COVERAGE_BITMAP_FILENAME} in {args.log}.")
+        else:
+            start_time = time.time()
+            render_reports(args.log, bitmap)
+            print(f"Rendered in {time.time() - start_time:.1f}s")
@@ -0,0 +1,195 @@
+import os
+import mmap
+import select
+import signal
+import struct
+import tempfile
+import time
+
+# File descriptor numbers the Fuzzilli-patched jsc expects in --reprl mode.
+REPRL_CHILD_CTRL_IN = 100
+REPRL_CHILD_CTRL_OUT = 101
+REPRL_CHILD_DATA_IN = 102
+REPRL_CHILD_DATA_OUT = 103
+
+REPRL_MAX_DATA_SIZE = 16 << 20
+
+class REPRLError(Exception):
+    pass
+
+def _read_exact(fd, size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def _decode_wait_status(status):
+    # Same convention as subprocess: negative values are signals.
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return -9999
+
+class REPRLExecutor:
+    # One long-lived jsc that runs many scripts over the REPRL protocol: control
+    # pipes on fds 100/101, the script in a shared data region on fd 102 and the
+    # coverage bitmap in the executor's own ShmRegion, passed as SHM_ID. The
+    # child is restarted lazily after it crashes or times out.
+
+    def __init__(self, jsc_path, region, jsc_args=('--reprl',), env=None):
+        self.jsc_path = jsc_path
+        self.jsc_args = list(jsc_args)
+        self.region = region
+        self.coverage = region.mapfile
+        self.env = dict(os.environ if env is None else env)
+        self.env['SHM_ID'] = region.name
+
+        self.pid = None
+        self.ctrl_in = None
+        self.ctrl_out = None
+        self.startup_output = ''
+        self.executions = 0
+        self.spawns = 0
+
+        self.data_in_fd = os.memfd_create('reprl_data_in')
+        os.ftruncate(self.data_in_fd, REPRL_MAX_DATA_SIZE)
+        self.data_in = mmap.mmap(self.data_in_fd, REPRL_MAX_DATA_SIZE)
+        self.data_out_fd = os.memfd_create('reprl_data_out')
+        os.ftruncate(self.data_out_fd, REPRL_MAX_DATA_SIZE)
+
+        self.stdout_file = tempfile.TemporaryFile()
+        self.stderr_file = tempfile.TemporaryFile()
+
+    def _spawn(self):
+        child_ctrl_in, parent_ctrl_w = os.pipe()
+        parent_ctrl_r, child_ctrl_out = os.pipe()
+
+        file_actions = [
+            (os.POSIX_SPAWN_DUP2, self.stdout_file.fileno(), 1),
+            (os.POSIX_SPAWN_DUP2, self.stderr_file.fileno(), 2),
+            (os.POSIX_SPAWN_DUP2, child_ctrl_in, REPRL_CHILD_CTRL_IN),
+            (os.POSIX_SPAWN_DUP2, child_ctrl_out, REPRL_CHILD_CTRL_OUT),
+            (os.POSIX_SPAWN_DUP2, self.data_in_fd, REPRL_CHILD_DATA_IN),
+            (os.POSIX_SPAWN_DUP2, self.data_out_fd, REPRL_CHILD_DATA_OUT),
+        ]
+        self._reset_output()
+        try:
+            self.pid = os.posix_spawn(
+                self.jsc_path,
+                [self.jsc_path] + self.jsc_args,
+                self.env,
+                file_actions=file_actions,
+            )
+        finally:
+            os.close(child_ctrl_in)
+            os.close(child_ctrl_out)
+        self.ctrl_in = parent_ctrl_w
+        self.ctrl_out = parent_ctrl_r
+
+        ready, _, _ = select.select([self.ctrl_out], [], [], 10)
+        helo = _read_exact(self.ctrl_out, 4) if ready else b''
+        if helo != b'HELO':
+            self._kill()
+            raise REPRLError(f"REPRL handshake with {self.jsc_path} failed (got {helo!r})")
+        os.write(self.ctrl_in, b'HELO')
+
+        # Anything jsc printed during startup, e.g. the "[COV] edge counters
+        # initialized" line, is kept aside before the first execution resets it.
+        self.startup_output = self._read_output(self.stdout_file)
+        self.startup_output += self._read_output(self.stderr_file)
+        self.spawns += 1
+
+    def _kill(self):
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                os.waitpid(self.pid, 0)
+            except ChildProcessError:
+                pass
+            self.pid = None
+        for fd in (self.ctrl_in, self.ctrl_out):
+            if fd is not None:
+                os.close(fd)
+        self.ctrl_in = None
+        self.ctrl_out = None
+
+    def _reap(self):
+        _, status = os.waitpid(self.pid, 0)
+        self.pid = None
+        self._kill()
+        return _decode_wait_status(status)
+
+    def _reset_output(self):
+        for f in (self.stdout_file, self.stderr_file):
+            f.seek(0)
+            f.truncate()
+
+    def _read_output(self, f):
+        f.seek(0)
+        return f.read().decode(errors='replace')
+
+    def reset_coverage(self):
+        self.region.reset()
+
+    def execute(self, javascript_code, timeout=5):
+        script = javascript_code.encode()
+        if len(script) > REPRL_MAX_DATA_SIZE:
+            raise REPRLError(f"Script of {len(script)} bytes exceeds the REPRL data channel")
+
+        if self.pid is None:
+            self._spawn()
+
+        self.reset_coverage()
+        self._reset_output()
+        self.data_in.seek(0)
+        self.data_in.write(script)
+
+        start_time = time.time()
+        try:
+            os.write(self.ctrl_in, b'exec' + struct.pack('<Q', len(script)))
+        except BrokenPipeError:
+            # The child died while idle; start a fresh one and run the script there.
+            self._reap()
+            self._spawn()
+            self._reset_output()
+            start_time = time.time()
+            os.write(self.ctrl_in, b'exec' + struct.pack('<Q', len(script)))
+
+        ready, _, _ = select.select([self.ctrl_out], [], [], timeout)
+        if not ready:
+            self._kill()
+            jsc_status = 'timeout'
+        else:
+            status = _read_exact(self.ctrl_out, 4)
+            if len(status) != 4:
+                jsc_status = self._reap()
+            else:
+                jsc_status = (struct.unpack('<i', status)[0] >> 8) & 0xff
+        execution_time = time.time() - start_time
+        self.executions += 1
+
+        stdout_decoded = self._read_output(self.stdout_file)
+        stderr_decoded = self._read_output(self.stderr_file)
+        return jsc_status, stdout_decoded, stderr_decoded, execution_time
+
+    def close(self):
+        self._kill()
+        self.data_in.close()
+        os.close(self.data_in_fd)
+        os.close(self.data_out_fd)
+        self.stdout_file.close()
+        self.stderr_file.close()
+        self.region.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
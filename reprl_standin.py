@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import mmap
+import signal
+import struct
+import time
+import re
+import zlib
+
+# A stand-in for the Fuzzilli-patched jsc in --reprl mode, so the REPRL
+# executor can be exercised without a JavaScriptCore build. Without --reprl
+# it runs the script file given on the command line once, like jsc does. Scripts are not
+# really executed: every distinct source line lights up one coverage edge, and
+# a few markers emulate the interesting outcomes:
+#   crash()            -> SIGSEGV
+#   fatal()            -> prints ASSERTION FAILED and aborts
+#   while (true) {}    -> hangs until the parent times it out
+#   a line with "?!"   -> SyntaxError, exit status 3
+#   undefinedVariable  -> ReferenceError, exit status 3
+#   quit()             -> the process exits with status 0
+# A script consisting of checkSyntax("file.js") only parses that file.
+
+REPRL_CRFD = 100
+REPRL_CWFD = 101
+REPRL_DRFD = 102
+REPRL_MAX_DATA_SIZE = 16 << 20
+
+NUM_EDGES = 1 << 16
+
+def open_coverage_map():
+    shm_id = os.environ.get('SHM_ID')
+    if not shm_id:
+        return None
+    fd = os.open('/dev/shm' + shm_id, os.O_RDWR)
+    size = os.fstat(fd).st_size
+    coverage = mmap.mmap(fd, size)
+    os.close(fd)
+    return coverage
+
+def read_exact(fd, size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            sys.exit(0)
+        data += chunk
+    return data
+
+def check_syntax(path):
+    with open(path, 'r', errors='replace') as f:
+        if '?!' in f.read():
+            print("Exception: SyntaxError: Unexpected token '?'", file=sys.stderr)
+            return 3
+    return 0
+
+def execute(script, coverage):
+    match = re.fullmatch(r'checkSyntax\((".*")\);', script.strip())
+    if match:
+        return check_syntax(json.loads(match.group(1)))
+    for line in script.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if coverage is not None:
+            edge = zlib.crc32(line.encode()) % min(NUM_EDGES, len(coverage) * 8)
+            coverage[edge // 8] |= 1 << (edge % 8)
+        if '?!' in line:
+            print("SyntaxError: Unexpected token '?'", file=sys.stderr)
+            return 3
+        if 'undefinedVariable' in line:
+            print("Exception: ReferenceError: Can't find variable: undefinedVariable", file=sys.stderr)
+            return 3
+        if 'crash()' in line:
+            sys.stderr.flush()
+            os.kill(os.getpid(), signal.SIGSEGV)
+        if 'fatal()' in line:
+            print("ASSERTION FAILED: !m_isCompiled\n"
+                  "Source/JavaScriptCore/bytecode/CodeBlock.cpp(1234) : void JSC::CodeBlock::finalize()",
+                  file=sys.stderr)
+            sys.stderr.flush()
+            os.abort()
+        if 'while (true)' in line:
+            while True:
+                time.sleep(1)
+        if 'quit()' in line:
+            sys.stdout.flush()
+            os._exit(0)
+    print("OK")
+    return 0
+
+def main():
+    coverage = open_coverage_map()
+    print(f"[COV] edge counters initialized. Shared memory: {os.environ.get('SHM_ID')} with {NUM_EDGES} edges")
+    sys.stdout.flush()
+
+    if '--reprl' not in sys.argv[1:]:
+        # Plain "jsc file.js" invocation, as used by the spawn-per-test path.
+        with open(sys.argv[1], 'r', errors='replace') as f:
+            script = f.read()
+        sys.exit(execute(script, coverage))
+
+    os.write(REPRL_CWFD, b'HELO')
+    if read_exact(REPRL_CRFD, 4) != b'HELO':
+        sys.exit("Invalid response from parent")
+    data = mmap.mmap(REPRL_DRFD, REPRL_MAX_DATA_SIZE, prot=mmap.PROT_READ)
+
+    while True:
+        action = read_exact(REPRL_CRFD, 4)
+        if action != b'exec':
+            sys.exit(f"Unknown action: {action!r}")
+        script_size = struct.unpack('<Q', read_exact(REPRL_CRFD, 8))[0]
+        script = data[:script_size].decode(errors='replace')
+        result = execute(script, coverage)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.write(REPRL_CWFD, struct.pack('<i', (result & 0xff) << 8))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import os
+import csv
+import glob
+import json
+import time
+import zlib
+import hashlib
+import atexit
+import sqlite3
+import argparse
+import fuzz
+
+RESULTS_DIRNAME = 'results'
+SEGMENT_PATTERN = 'results_*.sqlite'
+# Records per segment file; a full segment is never written again.
+SEGMENT_RECORDS = 100000
+# Records are committed in batches of FLUSH_RECORDS or every FLUSH_INTERVAL
+# seconds, and right away for a crash.
+FLUSH_RECORDS = 100
+FLUSH_INTERVAL = 5
+CRASH_CONDITION = "bug_type = 'fatal_error' OR bug_type GLOB 'crash_signal_*'"
+
+def segment_path(directory, number):
+    return os.path.join(directory, f'results_{number:04d}.sqlite')
+
+def segment_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN)))
+
+def open_segment(path):
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS records ('
+        'id INTEGER PRIMARY KEY, '
+        'name TEXT NOT NULL, '
+        'iteration INTEGER, '
+        'pillm_run INTEGER NOT NULL, '
+        'hash TEXT NOT NULL, '
+        'bug_type TEXT, '
+        'execution_time REAL, '
+        'new_edges INTEGER, '
+        'data BLOB NOT NULL)'
+    )
+    connection.execute('CREATE INDEX IF NOT EXISTS records_hash ON records (hash)')
+    connection.execute('CREATE INDEX IF NOT EXISTS records_bug_type ON records (bug_type)')
+    connection.commit()
+    return connection
+
+def decode_record(data):
+    # The record_data of process_result(), as written to the record files.
+    return json.loads(zlib.decompress(data))
+
+# The records of a campaign in <output>/results: SQLite segments of at most
+# SEGMENT_RECORDS rows, each holding the zlib-compressed JSON record_data of
+# one run next to the columns it is searched by (program hash, bug type).
+# The name of every record is the record_*.txt name it would have had, so
+# export_records() can write the old text files back. The CSV coverage log is
+# kept open and flushed with the records.
+class ResultStore:
+
+    def __init__(self, output_folder):
+        self.directory = os.path.join(output_folder, RESULTS_DIRNAME)
+        os.makedirs(self.directory, exist_ok=True)
+        paths = segment_paths(self.directory)
+        self.segment = len(paths) - 1 if paths else 0
+        self.connection = open_segment(segment_path(self.directory, self.segment))
+        self.segment_rows = self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+        self.pending = 0
+        self.last_flush = time.time()
+        coverage_log_path = os.path.join(output_folder, fuzz.COVERAGE_LOG_FILENAME)
+        write_header = not os.path.exists(coverage_log_path) or os.path.getsize(coverage_log_path) == 0
+        self.coverage_log = open(coverage_log_path, 'a', newline='')
+        self.coverage_writer = csv.DictWriter(self.coverage_log, fieldnames=fuzz.COVERAGE_LOG_FIELDS)
+        if write_header:
+            self.coverage_writer.writeheader()
+        atexit.register(self.close)
+
+    def add(self, name, iteration, pillm_run, record_data):
+        if self.segment_rows >= SEGMENT_RECORDS:
+            self.flush()
+            self.connection.close()
+            self.segment += 1
+            self.connection = open_segment(segment_path(self.directory, self.segment))
+            self.segment_rows = 0
+        data = zlib.compress(json.dumps(record_data).encode())
+        program_hash = hashlib.sha256(record_data['test_code'].encode()).hexdigest()
+        self.connection.execute(
+            'INSERT INTO records (name, iteration, pillm_run, hash, bug_type, execution_time, new_edges, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (name, iteration, int(pillm_run), program_hash, record_data.get('bug_type'),
+             record_data.get('execution_time'), record_data.get('new_edges'), data))
+        self.segment_rows += 1
+        self.pending += 1
+        if fuzz.is_crash(record_data.get('bug_type')):
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def log_coverage(self, log_data):
+        self.coverage_writer.writerow(log_data)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        if self.pending >= FLUSH_RECORDS or time.time() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.connection.commit()
+        self.coverage_log.flush()
+        self.pending = 0
+        self.last_flush = time.time()
+
+    def close(self):
+        if self.coverage_log.closed:
+            return
+        self.flush()
+        self.connection.close()
+        self.coverage_log.close()
+
+def read_records(output_folder, condition='1', parameters=()):
+    # (name, record_data) of the stored records matching an SQL condition on
+    # the records table, oldest first.
+    for path in segment_paths(os.path.join(output_folder, RESULTS_DIRNAME)):
+        connection = sqlite3.connect(path, timeout=30)
+        try:
+            query = f'SELECT name, data FROM records WHERE {condition} ORDER BY id'
+            for name, data in connection.execute(query, parameters):
+                yield name, decode_record(data)
+        finally:
+            connection.close()
+
+def crash_records(output_folder, coverage_only=False):
+    if coverage_only:
+        return read_records(output_folder, f'({CRASH_CONDITION}) AND pillm_run = 0')
+    return read_records(output_folder, CRASH_CONDITION)
+
+def export_records(output_folder, destination, condition='1', parameters=()):
+    os.makedirs(destination, exist_ok=True)
+    exported = 0
+    for name, record_data in read_records(output_folder, condition, parameters):
+        with open(os.path.join(destination, name), 'w') as record_file:
+            for key, value in record_data.items():
+                record_file.write(f"{key}: {value}\n")
+        exported += 1
+    return exported
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the result store of a campaign or export it as record files.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder of the campaign')
+    parser.add_argument('--bug-type', type=str, default=None, help="Only records with this bug type ('crash' for all crashes)")
+    parser.add_argument('--hash', type=str, default=None, help='Only records of the program with this SHA-256 (or a prefix)')
+    parser.add_argument('--export', type=str, default=None, metavar='DIR',
+                        help='Write the selected records as record_*.txt files to DIR')
+    args = parser.parse_args()
+
+    conditions, parameters = [], []
+    if args.bug_type == 'crash':
+        conditions.append(f'({CRASH_CONDITION})')
+    elif args.bug_type:
+        conditions.append('bug_type = ?')
+        parameters.append(args.bug_type)
+    if args.hash:
+        conditions.append('hash GLOB ?')
+        parameters.append(args.hash.lower() + '*')
+    condition = ' AND '.join(conditions) or '1'
+
+    if args.export:
+        exported = export_records(args.log, args.export, condition, tuple(parameters))
+        print(f"Exported {exported} records to {args.export}")
+    else:
+        counts = {}
+        for path in segment_paths(os.path.join(args.log, RESULTS_DIRNAME)):
+            connection = sqlite3.connect(path, timeout=30)
+            query = f'SELECT bug_type, COUNT(*) FROM records WHERE {condition} GROUP BY bug_type'
+            for bug_type, count in connection.execute(query, parameters):
+                counts[bug_type] = counts.get(bug_type, 0) + count
+            connection.close()
+        print(f"{sum(counts.values())} records:")
+        for bug_type, count in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"  {count:8d} {bug_type or 'no bug'}")
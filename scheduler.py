@@ -0,0 +1,149 @@
+import json
+import math
+import random
+
+SCHEDULER_LOG_FILENAME = 'scheduler_log.jsonl'
+POLICIES = ('ucb', 'weighted')
+
+def target_key(filename, start_line, end_line):
+    return f"{filename}:{start_line}:{end_line}"
+
+def parse_target_key(key):
+    filename, start_line, end_line = key.rsplit(':', 2)
+    return filename, int(start_line), int(end_line)
+
+def new_entry():
+    return {
+        'targeted': 0,
+        'runs': 0,
+        'hits': 0,
+        'new_edges': 0,
+        'cost': 0.0,
+        'failures': 0,
+        'strikes': 0,
+        'cooldown_until': 0,
+    }
+
+# Chooses the next target function among the functions called in the newest
+# PILLM trace, instead of always taking the last call. Keeps per-function
+# statistics: times targeted, calls seen in traces, new edges found by the
+# programs generated for it and their execution time. A function whose
+# programs find nothing `cooldown_after` times in a row is skipped for
+# `cooldown` targetings, twice as long at every new strike.
+class TargetScheduler:
+
+    def __init__(self, policy='ucb', cooldown_after=3, cooldown=10, exploration=1.0, state=None):
+        self.policy = policy
+        self.cooldown_after = cooldown_after
+        self.cooldown = cooldown
+        self.exploration = exploration
+        self.stats = {}
+        self.clock = 0
+        self.traces = 0
+        # Bumped by every change of stats; changed holds the version of the
+        # last change of each key, oldest first, for changes().
+        self.version = 0
+        self.changed = {}
+        self.log_file = None
+        if state:
+            self.load(state)
+
+    def load(self, state):
+        self.stats = state['stats']
+        self.clock = state['clock']
+        self.traces = state['traces']
+
+    def state(self):
+        return {'clock': self.clock, 'traces': self.traces, 'stats': self.stats}
+
+    def changes(self, since=None):
+        # What a copy that has every change up to version since needs to
+        # catch up (the whole state if since is None), for merge().
+        if since is None:
+            changes = self.state()
+        else:
+            stats = {}
+            for key in reversed(self.changed):
+                if self.changed[key] <= since:
+                    break
+                stats[key] = self.stats[key]
+            changes = {'clock': self.clock, 'traces': self.traces, 'stats': stats}
+        changes['version'] = self.version
+        return changes
+
+    def merge(self, changes):
+        self.stats.update(changes['stats'])
+        self.clock = changes['clock']
+        self.traces = changes['traces']
+        self.version = changes['version']
+
+    def open_log(self, path):
+        # Every targeting and outcome as a JSON line, for bench_scheduler.py.
+        self.log_file = open(path, 'a', buffering=1)
+
+    def log(self, event):
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(event) + '\n')
+
+    def entry(self, key):
+        # The statistics of key, about to be changed.
+        if key not in self.stats:
+            self.stats[key] = new_entry()
+        self.version += 1
+        self.changed.pop(key, None)
+        self.changed[key] = self.version
+        return self.stats[key]
+
+    def score(self, key):
+        entry = self.stats.get(key) or new_entry()
+        # New edges per program with one optimistic edge as prior, plus the
+        # UCB1 bonus for functions that were rarely targeted.
+        value = (entry['new_edges'] + 1) / (entry['runs'] + 1)
+        bonus = self.exploration * math.sqrt(math.log(self.clock + 2) / (entry['targeted'] + 1))
+        # Functions called in most traces, the trivial getters, and slow
+        # programs weigh less.
+        frequency = entry['hits'] / max(self.traces, 1)
+        cost = entry['cost'] / entry['runs'] if entry['runs'] else 0.0
+        return (value + bonus) / ((1 + math.log1p(frequency)) * (1 + cost))
+
+    def choose(self, candidates):
+        # candidates: target keys, oldest call first. None when all of them
+        # are cooling down, so that a random function is used instead.
+        available = [key for key in candidates
+                     if key not in self.stats or self.stats[key]['cooldown_until'] <= self.clock]
+        if not available:
+            return None
+        if self.policy == 'weighted':
+            return random.choices(available, weights=[self.score(key) for key in available])[0]
+        # The newest call wins ties.
+        return max(reversed(available), key=self.score)
+
+    def assign(self, key, observed):
+        # A trace was read and key (None for a random function) targeted.
+        if observed:
+            self.traces += 1
+            for observed_key, calls in observed.items():
+                self.entry(observed_key)['hits'] += calls
+        self.clock += 1
+        if key is not None:
+            self.entry(key)['targeted'] += 1
+        self.log({'clock': self.clock, 'observed': observed, 'target': key})
+
+    def record(self, key, new_edges, cost):
+        entry = self.entry(key)
+        entry['runs'] += 1
+        entry['new_edges'] += new_edges
+        entry['cost'] += cost
+        if new_edges:
+            entry['failures'] = 0
+            entry['strikes'] = 0
+        else:
+            entry['failures'] += 1
+            if entry['failures'] >= self.cooldown_after:
+                entry['cooldown_until'] = self.clock + self.cooldown * 2 ** entry['strikes']
+                entry['strikes'] += 1
+                entry['failures'] = 0
+        self.log({'target': key, 'new_edges': new_edges, 'cost': cost})
+
+    def cooling(self):
+        return sum(1 for entry in self.stats.values() if entry['cooldown_until'] > self.clock)
@@ -0,0 +1,95 @@
+import os
+import re
+import mmap
+import atexit
+import signal
+import secrets
+import itertools
+import posix_ipc
+import numpy as np
+
+SHM_PREFIX = '/pillm_cov'
+SHM_DIR = '/dev/shm'
+
+_counter = itertools.count()
+_regions = {}
+
+# A coverage region that is created once per executor and reused for every
+# run. Names embed the owner's pid so that stale regions from a crashed
+# campaign can be found and removed by cleanup_stale_regions().
+class ShmRegion:
+
+    def __init__(self, size, prefix=SHM_PREFIX):
+        self.size = size
+        self.owner_pid = os.getpid()
+        self.name = f"{prefix}_{self.owner_pid}_{next(_counter)}_{secrets.token_hex(4)}"
+        shm = posix_ipc.SharedMemory(self.name, flags=posix_ipc.O_CREX, mode=0o600, size=size)
+        self.mapfile = mmap.mmap(shm.fd, size, prot=mmap.PROT_READ | mmap.PROT_WRITE)
+        shm.close_fd()
+        self.array = np.frombuffer(self.mapfile, dtype=np.uint8)
+        _regions[self.name] = self
+
+    def reset(self):
+        self.array[:] = 0
+
+    def release(self):
+        if self.mapfile is None:
+            return
+        del self.array
+        self.mapfile.close()
+        self.mapfile = None
+        _regions.pop(self.name, None)
+        if os.getpid() == self.owner_pid:
+            try:
+                posix_ipc.unlink_shared_memory(self.name)
+            except posix_ipc.ExistentialError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def allocate_region(size):
+    return ShmRegion(size)
+
+def release_all():
+    for region in list(_regions.values()):
+        region.release()
+
+def cleanup_stale_regions(prefix=SHM_PREFIX):
+    # Remove regions left behind by fuzzers that were killed before they could
+    # run their atexit handlers.
+    pattern = re.compile(re.escape(prefix.lstrip('/')) + r'_(\d+)_')
+    removed = 0
+    if not os.path.isdir(SHM_DIR):
+        return removed
+    for entry in os.listdir(SHM_DIR):
+        match = pattern.match(entry)
+        if not match:
+            continue
+        pid = int(match.group(1))
+        try:
+            os.kill(pid, 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+        try:
+            posix_ipc.unlink_shared_memory('/' + entry)
+            removed += 1
+        except posix_ipc.ExistentialError:
+            pass
+    return removed
+
+def _terminate(signum, frame):
+    raise SystemExit(128 + signum)
+
+def install_signal_handlers():
+    # SIGTERM normally skips atexit; turn it into SystemExit so regions are released.
+    if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _terminate)
+
+atexit.register(release_all)
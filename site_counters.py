@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import shm_regions
+import extract_functions
+
+PILLM_SHM_ENV = 'PILLM_SHM_ID'
+SITES_SHM_PREFIX = '/pillm_sites'
+REGION_MAGIC = b'PILLMSHM'
+RING_SIZE = 100
+
+# Must match PillmRegionHeader in PILLMInstrumentation.h. The ring of
+# (execution index << 24) | site ID slots and the u32 hit counters follow it.
+REGION_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('site_count', '<u4'),
+    ('ring_size', '<u4'),
+    ('reserved', '<u4'),
+    ('index', '<u8'),
+])
+
+def site_count_from_table(sites_path):
+    return os.path.getsize(sites_path) // extract_functions.SITE_DTYPE.itemsize
+
+# Shared memory region the PILLM JSC records into when PILLM_SHM_ID names it,
+# sized by the real number of sites. Reusable across runs like the coverage
+# regions; reset() before each run. The views are taken per call so that the
+# region can be released at any time.
+class SiteCounterRegion:
+
+    def __init__(self, site_count, ring_size=RING_SIZE):
+        self.site_count = site_count
+        self.ring_size = ring_size
+        self.ring_offset = REGION_HEADER_DTYPE.itemsize
+        self.hits_offset = self.ring_offset + ring_size * 8
+        self.region = shm_regions.ShmRegion(self.hits_offset + site_count * 4, prefix=SITES_SHM_PREFIX)
+        self.name = self.region.name
+        self.reset()
+
+    @property
+    def header(self):
+        return self.region.array[:self.ring_offset].view(REGION_HEADER_DTYPE)
+
+    @property
+    def ring(self):
+        return self.region.array[self.ring_offset:self.hits_offset].view('<u8')
+
+    @property
+    def hits(self):
+        return self.region.array[self.hits_offset:].view('<u4')
+
+    def reset(self):
+        self.region.reset()
+        self.header[0] = (REGION_MAGIC, 1, self.site_count, self.ring_size, 0, 0)
+
+    def env(self):
+        return {PILLM_SHM_ENV: self.name}
+
+    def total_calls(self):
+        return int(self.header[0]['index'])
+
+    def records(self):
+        # The ring in call order, oldest first, as pillm_trace.bin holds it.
+        total = self.total_calls()
+        start = max(0, total - self.ring_size)
+        return self.ring[np.arange(start, total) % self.ring_size]
+
+    def sparse_hits(self):
+        hits = self.hits
+        sites = np.flatnonzero(hits).astype(np.uint32)
+        return sites, hits[sites]
+
+    def write_trace(self, trace_file, sites_path):
+        # Same layout as the runtime's pillm_dump_last_100(), so the snippet
+        # extraction works for runs that never reached their exit dump.
+        records = self.records()
+        path = sites_path.encode()
+        records_offset = (extract_functions.TRACE_HEADER_DTYPE.itemsize + len(path) + 7) & ~7
+        header = np.array([(extract_functions.TRACE_MAGIC, 1, records_offset, self.total_calls(),
+                            len(records), len(path))], dtype=extract_functions.TRACE_HEADER_DTYPE)
+        with open(trace_file, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(path.ljust(records_offset - header.itemsize, b'\0'))
+            f.write(records.astype('<u8').tobytes())
+
+    def release(self):
+        self.region.release()
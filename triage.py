@@ -0,0 +1,198 @@
+import os
+import re
+import glob
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import fuzz
+import results_store
+
+TRIAGE_DIRNAME = 'triage'
+BUCKETS_FILENAME = 'buckets.json'
+RECORDS_FILENAME = 'records.txt'
+TOP_FRAMES = 3
+
+# "ASSERTION FAILED: <condition>" followed by "<file>(<line>) : <function>",
+# as printed by WTFReportAssertionFailure.
+ASSERTION_PATTERN = re.compile(r'ASSERTION FAILED: ?(.*)\n\s*(\S+)\((\d+)\) : (.*)')
+# Backtrace lines of WTFReportBacktrace ("3   0x1234 JSC::foo()") and of
+# sanitizers ("#3 0x1234 in JSC::foo() file.cpp:12").
+FRAME_PATTERN = re.compile(r'^\s*#?\d+\s+0x[0-9a-fA-F]+\s+(?:in\s+)?(.+)$', re.MULTILINE)
+# libJavaScriptCore.so(_ZN3JSC3fooEv+0x12) [0x7f...] from unsymbolized glibc backtraces.
+RAW_FRAME_PATTERN = re.compile(r'\(([^()+\s]+)\+0x[0-9a-fA-F]+\)')
+ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]+')
+NUMBER_PATTERN = re.compile(r'\d+')
+# Record files carry the bug type in their name.
+CRASH_RECORD_PATTERN = re.compile(r'_(?:crash_signal_\d+|fatal_error)\.txt$')
+# Frames of the crash reporting itself, skipped when taking the top frames.
+REPORTING_FRAMES = ('WTFCrash', 'WTFReport', 'WTF::', 'abort', 'raise', '__pthread', '__libc', '__GI_',
+                    '__asan', '__sanitizer', '__ubsan', 'CRASH_WITH_INFO', 'gsignal')
+
+def frame_symbol(frame):
+    raw = RAW_FRAME_PATTERN.search(frame)
+    symbol = raw.group(1) if raw else frame.strip()
+    # Drop argument lists, offsets and source locations.
+    symbol = re.split(r'\(| \+ | /|\s+\S+\.(?:cpp|h|c|mm):', symbol, maxsplit=1)[0]
+    return symbol.strip()
+
+def top_frames(stderr_decoded):
+    frames = []
+    for match in FRAME_PATTERN.finditer(stderr_decoded):
+        symbol = frame_symbol(match.group(1))
+        if not symbol or symbol.startswith(REPORTING_FRAMES) or symbol.startswith('0x'):
+            continue
+        frames.append(symbol)
+        if len(frames) == TOP_FRAMES:
+            break
+    return frames
+
+def crash_signal(jsc_status, bug_type):
+    if bug_type and bug_type.startswith('crash_signal_'):
+        return int(bug_type[len('crash_signal_'):])
+    try:
+        status = int(jsc_status)
+    except (TypeError, ValueError):
+        return None
+    return -status if status < 0 else None
+
+def crash_signature(jsc_status, stderr_decoded, bug_type):
+    # What identifies a crash across runs: the assertion location if there
+    # is one, else the top frames, else the first fatal message; plus the
+    # signal.
+    signature = {'signal': crash_signal(jsc_status, bug_type)}
+    assertion = ASSERTION_PATTERN.search(stderr_decoded)
+    if assertion:
+        signature['assertion'] = assertion.group(1).strip()
+        signature['location'] = f"{os.path.basename(assertion.group(2))}:{assertion.group(3)}"
+        signature['function'] = assertion.group(4).strip()
+    frames = top_frames(stderr_decoded)
+    if frames:
+        signature['frames'] = frames
+    for line in stderr_decoded.splitlines():
+        if any(keyword in line for keyword in fuzz.FATAL_ERROR_KEYWORDS):
+            signature['message'] = NUMBER_PATTERN.sub('N', ADDRESS_PATTERN.sub('0x', line.strip()))
+            break
+    return signature
+
+def bucket_id(signature):
+    if 'location' in signature:
+        parts = ['assertion', signature['location'], signature['function']]
+    elif 'frames' in signature:
+        parts = ['frames'] + signature['frames']
+    else:
+        parts = ['message', signature.get('message', '')]
+    parts.append(f"signal {signature['signal']}")
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()[:12]
+
+def describe(signature):
+    if 'location' in signature:
+        return f"ASSERTION {signature['assertion']} at {signature['location']} in {signature['function']}"
+    if 'frames' in signature:
+        return ' <- '.join(signature['frames'])
+    if signature.get('message'):
+        return signature['message']
+    return f"signal {signature['signal']}"
+
+# Crash buckets of a campaign in <output>/triage: buckets.json with the
+# signature, count and first and last record of every bucket, <bucket>.js,
+# the smallest program that crashed into it, and records.txt, the record
+# files already bucketed.
+class CrashTriage:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.buckets = {}
+        self.records = set()
+        buckets_path = os.path.join(directory, BUCKETS_FILENAME)
+        if os.path.exists(buckets_path):
+            with open(buckets_path, 'r') as f:
+                self.buckets = json.load(f)
+        records_path = os.path.join(directory, RECORDS_FILENAME)
+        if os.path.exists(records_path):
+            with open(records_path, 'r') as f:
+                self.records = set(f.read().splitlines())
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        buckets_path = os.path.join(self.directory, BUCKETS_FILENAME)
+        with open(buckets_path + '.tmp', 'w') as f:
+            json.dump(self.buckets, f, indent=1)
+        os.replace(buckets_path + '.tmp', buckets_path)
+
+    def add(self, javascript_code, signature, bug_type, record_filepath=None):
+        # Returns the bucket and whether it is new; save() writes the index.
+        bucket = bucket_id(signature)
+        new = bucket not in self.buckets
+        if new:
+            self.buckets[bucket] = {'signature': signature, 'bug_type': bug_type, 'count': 0,
+                                    'reproducer_size': None, 'first_record': record_filepath}
+        entry = self.buckets[bucket]
+        entry['count'] += 1
+        entry['last_record'] = record_filepath
+        if entry['reproducer_size'] is None or len(javascript_code) < entry['reproducer_size']:
+            os.makedirs(self.directory, exist_ok=True)
+            reproducer_path = os.path.join(self.directory, f'{bucket}.js')
+            with open(reproducer_path + '.tmp', 'w') as f:
+                f.write(javascript_code)
+            os.replace(reproducer_path + '.tmp', reproducer_path)
+            entry['reproducer_size'] = len(javascript_code)
+        if record_filepath:
+            self.records.add(os.path.basename(record_filepath))
+            with open(os.path.join(self.directory, RECORDS_FILENAME), 'a') as f:
+                f.write(os.path.basename(record_filepath) + '\n')
+        return bucket, new
+
+    def record(self, javascript_code, jsc_status, stderr_decoded, bug_type, record_filepath):
+        # A crash found while fuzzing.
+        signature = crash_signature(jsc_status, stderr_decoded, bug_type)
+        bucket, new = self.add(javascript_code, signature, bug_type, record_filepath)
+        self.save()
+        if new:
+            print(f"New crash bucket {bucket}: {describe(signature)}")
+        return bucket
+
+def parse_crash(stored):
+    record_name, record = stored
+    bug_type = record.get('bug_type')
+    if not fuzz.is_crash(bug_type) or 'test_code' not in record:
+        return None
+    signature = crash_signature(record.get('jsc_status'), record.get('stderr') or '', bug_type)
+    return record_name, record['test_code'], signature, bug_type
+
+def read_crash(record_filepath):
+    return parse_crash((record_filepath, fuzz.read_record(record_filepath)))
+
+def triage_outputs(output_folder, jobs):
+    # Buckets the crash records of an output folder that are not in its
+    # triage yet, from the result store and from record files of older
+    # campaigns; the records are parsed by a pool of processes. Like while
+    # fuzzing, only the coverage runs are bucketed.
+    crash_triage = CrashTriage(os.path.join(output_folder, TRIAGE_DIRNAME))
+    stored = [(name, record) for name, record in results_store.crash_records(output_folder, coverage_only=True)
+              if name not in crash_triage.records]
+    record_files = [path for path in sorted(glob.glob(os.path.join(output_folder, 'record_*.txt')))
+                    if CRASH_RECORD_PATTERN.search(path) and not os.path.basename(path).startswith('record_pillm_')
+                    and os.path.basename(path) not in crash_triage.records]
+    added = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        crashes = list(pool.map(parse_crash, stored, chunksize=64)) + \
+                  list(pool.map(read_crash, record_files, chunksize=64))
+    for crash in crashes:
+        if crash is not None:
+            crash_triage.add(*crash[1:], crash[0])
+            added += 1
+    crash_triage.save()
+    return crash_triage, added
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bucket the crashes recorded in an output folder.')
+    parser.add_argument('--log', type=str, default='output', help='Output folder holding the record files')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Processes reading the record files')
+    args = parser.parse_args()
+
+    crash_triage, added = triage_outputs(args.log, args.jobs)
+    print(f"{added} crashes added, {len(crash_triage.buckets)} buckets:")
+    for bucket, entry in sorted(crash_triage.buckets.items(), key=lambda item: -item[1]['count']):
+        print(f"  {bucket} {entry['count']:6d}x {entry['bug_type']:>16} {entry['reproducer_size']:6d}B  "
+              f"{describe(entry['signature'])}")